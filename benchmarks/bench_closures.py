@@ -0,0 +1,105 @@
+"""
+Measures what closures cost: the memory a long-lived callback keeps alive
+when it is created in a function with many locals, and the time to read a
+captured variable from a closure declared several scopes deep.
+
+    python benchmarks/bench_closures.py [--engine ENGINE] [--callbacks N] [--reads N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from lox import Lox  # noqa: E402
+
+
+def callbacks_program(count):
+    # Each call of make() builds a few strings the callback doesn't use.
+    return f"""
+class Node {{
+    init(callback, next) {{
+        this.callback = callback;
+        this.next = next;
+    }}
+}}
+
+fun make(i) {{
+    var label = "callback number " + "with a fairly long label";
+    var scratch = label + label + label;
+    var more = scratch + scratch;
+    var id = i;
+    fun callback() {{ return id; }}
+    return callback;
+}}
+
+var callbacks = nil;
+for (var i = 0; i < {count}; i = i + 1) {{
+    callbacks = Node(make(i), callbacks);
+}}
+print(callbacks.callback());
+"""
+
+
+def reads_program(count):
+    return f"""
+fun outer() {{
+    var x = 1;
+    {{
+        var a = 0;
+        {{
+            var b = 0;
+            {{
+                var c = 0;
+                fun inner() {{
+                    var sum = 0;
+                    for (var i = 0; i < {count}; i = i + 1) {{
+                        {{ {{ sum = sum + x; }} }}
+                    }}
+                    return sum;
+                }}
+                return inner();
+            }}
+        }}
+    }}
+}}
+print(outer());
+"""
+
+
+def run(engine, source):
+    lox = Lox(engine)
+    with contextlib.redirect_stdout(io.StringIO()):
+        lox.run(source)
+    return lox
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--engine", default="tree")
+    arg_parser.add_argument("--callbacks", type=int, default=20000)
+    arg_parser.add_argument("--reads", type=int, default=200000)
+    options = arg_parser.parse_args(args)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    lox = run(options.engine, callbacks_program(options.callbacks))
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del lox
+
+    start = time.perf_counter()
+    run(options.engine, reads_program(options.reads))
+    elapsed = time.perf_counter() - start
+
+    print(f"engine {options.engine}")
+    print(f"  retained per callback:    {retained / options.callbacks:8.1f} bytes")
+    print(f"  {options.reads} captured reads: {elapsed * 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,58 @@
+"""
+Times every execution engine on the Lox programs in this directory.
+
+    python benchmarks/bench_engines.py [--repeat N] [program.lox ...]
+"""
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from lox import Lox, ENGINES  # noqa: E402
+
+
+def run_once(engine, source):
+    lox = Lox(engine)
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        lox.run(source)
+    elapsed = time.perf_counter() - start
+    return elapsed, output.getvalue()
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("programs", nargs="*")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    options = arg_parser.parse_args(args)
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    programs = options.programs or sorted(glob.glob(os.path.join(here, "*.lox")))
+    engines = sorted(ENGINES)
+
+    print(f"{'program':<16}" + "".join(f"{engine:>12}" for engine in engines))
+    for program in programs:
+        with open(program) as f:
+            source = f.read()
+        row = f"{os.path.basename(program):<16}"
+        outputs = set()
+        for engine in engines:
+            best = None
+            for _ in range(options.repeat):
+                elapsed, output = run_once(engine, source)
+                outputs.add(output)
+                best = elapsed if best is None else min(best, elapsed)
+            row += f"{best * 1000:>10.1f}ms"
+        if len(outputs) != 1:
+            row += "  (outputs differ!)"
+        print(row)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
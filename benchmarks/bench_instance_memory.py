@@ -0,0 +1,65 @@
+"""
+Measures the memory held per LoxInstance with three fields, comparing the
+shape based layout against the old per-instance `fields` dict.
+
+    python benchmarks/bench_instance_memory.py [--count N]
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import tokens  # noqa: E402
+from lox_class import LoxClass, LoxInstance  # noqa: E402
+
+FIELDS = [tokens.Token(tokens.IDENTIFIER, name, None, 1) for name in ("name", "value", "next")]
+
+
+class DictInstance:
+    """The previous LoxInstance layout: a plain object with a fields dict."""
+
+    def __init__(self, klass):
+        self.klass = klass
+        self.fields = {}
+
+    def set(self, name, value):
+        self.fields[name.lexeme] = value
+
+
+def bytes_per_instance(make_instance, count):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    instances = []
+    for i in range(count):
+        instance = make_instance()
+        for field in FIELDS:
+            instance.set(field, float(i))
+        instances.append(instance)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    total = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    # Leave out the list holding the instances and the float values themselves.
+    total -= sys.getsizeof(instances) + count * sys.getsizeof(0.0) * len(FIELDS)
+    return total / count
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--count", type=int, default=100000)
+    options = arg_parser.parse_args(args)
+
+    klass = LoxClass(tokens.Token(tokens.IDENTIFIER, "Node", None, 1), None, {})
+    old = bytes_per_instance(lambda: DictInstance(klass), options.count)
+    new = bytes_per_instance(lambda: LoxInstance(klass), options.count)
+
+    print(f"{options.count} instances with {len(FIELDS)} fields")
+    print(f"  fields dict (before): {old:7.1f} bytes/instance")
+    print(f"  shapes (after):       {new:7.1f} bytes/instance")
+    print(f"  reduction:            {(1 - new / old) * 100:7.1f}%")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,197 @@
+"""
+Compares the Pratt expression parser against the recursive-descent chain
+of one method per precedence level it replaced, on the benchmark programs
+repeated to a large source and on a source of expression statements. Both
+must produce the same syntax trees. Also reports how deeply parenthesized
+an expression each can parse before hitting Python's recursion limit.
+
+    python benchmarks/bench_parser.py [--size MB] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import expressions as Expr  # noqa: E402
+import tokens  # noqa: E402
+from bench_scanner import generated_source  # noqa: E402
+from parser import Parser  # noqa: E402
+from scanner import Scanner  # noqa: E402
+
+
+class RecursiveDescentParser(Parser):
+    """The previous expression grammar: one method per precedence level."""
+
+    def expression(self):
+        return self.assignment()
+
+    def assignment(self):
+        expr = self.logical_or()
+
+        if self.match(tokens.EQUAL):
+            equals = self.previous()
+            value = self.assignment()
+
+            if isinstance(expr, Expr.Variable):
+                return Expr.Assign(expr.name, value)
+            elif isinstance(expr, Expr.Get):
+                return Expr.Set(expr.object, expr.name, value)
+
+            self.error(equals, "Invalid Assignment Target")
+
+        return expr
+
+    def logical_or(self):
+        expr = self.logical_and()
+        while self.match(tokens.OR):
+            operator = self.previous()
+            right = self.logical_and()
+            expr = Expr.Logical(expr, operator, right)
+        return expr
+
+    def logical_and(self):
+        expr = self.equality()
+        while self.match(tokens.AND):
+            operator = self.previous()
+            right = self.equality()
+            expr = Expr.Logical(expr, operator, right)
+        return expr
+
+    def equality(self):
+        expr = self.comparison()
+        while self.match(tokens.BANG_EQUAL, tokens.EQUAL_EQUAL):
+            operator = self.previous()
+            right = self.comparison()
+            expr = Expr.Binary(left=expr, operator=operator, right=right)
+        return expr
+
+    def comparison(self):
+        expr = self.term()
+        while self.match(tokens.GREATER, tokens.GREATER_EQUAL, tokens.LESS, tokens.LESS_EQUAL):
+            operator = self.previous()
+            right = self.term()
+            expr = Expr.Binary(left=expr, operator=operator, right=right)
+        return expr
+
+    def term(self):
+        expr = self.factor()
+        while self.match(tokens.PLUS, tokens.MINUS):
+            operator = self.previous()
+            right = self.factor()
+            expr = Expr.Binary(left=expr, operator=operator, right=right)
+        return expr
+
+    def factor(self):
+        expr = self.unary()
+        while self.match(tokens.STAR, tokens.SLASH):
+            operator = self.previous()
+            right = self.unary()
+            expr = Expr.Binary(left=expr, operator=operator, right=right)
+        return expr
+
+    def unary(self):
+        if self.match(tokens.MINUS, tokens.BANG):
+            operator = self.previous()
+            right = self.unary()
+            return Expr.Unary(operator=operator, right=right)
+        return self.call()
+
+    def call(self):
+        expr = self.primary()
+        while True:
+            if self.match(tokens.LEFT_PAREN):
+                expr = self.finish_call(expr)
+            elif self.match(tokens.DOT):
+                name = self.consume(tokens.IDENTIFIER, "Expect property name after '.")
+                expr = Expr.Get(expr, name)
+            else:
+                break
+        return expr
+
+    def primary(self):
+        if self.match(tokens.FALSE):
+            return Expr.Literal(False)
+        if self.match(tokens.TRUE):
+            return Expr.Literal(True)
+        if self.match(tokens.NIL):
+            return Expr.Literal(None)
+        if self.match(tokens.NUMBER, tokens.STRING):
+            return Expr.Literal(self.previous().literal)
+        if self.match(tokens.SUPER):
+            keyword = self.previous()
+            self.consume(tokens.DOT, "Expect '.' after 'super'.")
+            method = self.consume(tokens.IDENTIFIER, "Expect superclass method name.")
+            return Expr.Super(keyword, method)
+        if self.match(tokens.THIS):
+            return Expr.This(self.previous())
+        if self.match(tokens.IDENTIFIER):
+            return Expr.Variable(self.previous())
+        if self.match(tokens.LEFT_PAREN):
+            expr = self.expression()
+            self.consume(tokens.RIGHT_PAREN, "Expect ')' after expression")
+            return Expr.Grouping(expr)
+
+        raise self.error(self.peek(), "Expect expression.")
+
+
+EXPRESSION = "x = a + b * (c - 1) < d and !e or f.g(h, -2) == \"s\";\n"
+
+
+def nesting_limit(parser_class):
+    depth = 16
+    while depth < 1 << 16:
+        source = "(" * depth + "1" + ")" * depth + ";"
+        try:
+            parser_class(Scanner(source, fail).scan_tokens(), fail).parse()
+        except RecursionError:
+            return depth // 2
+        depth *= 2
+    return depth
+
+
+def fail(*args):
+    raise SystemExit(f"error: {args}")
+
+
+def best_time(parser_class, token_buffer, repeat):
+    best = None
+    statements = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        statements = parser_class(token_buffer, fail).parse()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, statements
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--size", type=float, default=1.0, help="source size in MB")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    options = arg_parser.parse_args(args)
+
+    size = int(options.size * 1024 * 1024)
+    workloads = [
+        ("programs", generated_source(size)),
+        ("expressions", EXPRESSION * (size // len(EXPRESSION))),
+    ]
+    for name, source in workloads:
+        token_buffer = Scanner(source, fail).scan_tokens()
+        before, before_statements = best_time(RecursiveDescentParser, token_buffer, options.repeat)
+        after, after_statements = best_time(Parser, token_buffer, options.repeat)
+        assert repr(before_statements) == repr(after_statements)
+
+        print(f"{name}: {len(token_buffer)} tokens from {len(source) / (1024 * 1024):.1f}MB of source")
+        print(f"  recursive descent (before): {before * 1000:8.1f}ms")
+        print(f"  Pratt (after):              {after * 1000:8.1f}ms")
+        print(f"  speedup:                    {before / after:8.2f}x")
+
+    print("nested parentheses parsed (at least)")
+    print(f"  recursive descent (before): {nesting_limit(RecursiveDescentParser):8d}")
+    print(f"  Pratt (after):              {nesting_limit(Parser):8d}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
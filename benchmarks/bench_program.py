@@ -0,0 +1,65 @@
+"""
+Times serving many requests with one small script: running the source through
+a fresh Lox each time against compiling a Program once and running that.
+
+    python benchmarks/bench_program.py [--engine ENGINE] [--requests N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import program  # noqa: E402
+from lox import Lox  # noqa: E402
+
+SOURCE = """
+class Item {
+    init(price, count) {
+        this.price = price;
+        this.count = count;
+    }
+    total() { return this.price * this.count; }
+}
+
+fun order(n) {
+    var sum = 0;
+    for (var i = 1; i <= n; i = i + 1) sum = sum + Item(i, 2).total();
+    return sum;
+}
+
+print(order(20));
+"""
+
+
+def per_request(engine, requests):
+    for _ in range(requests):
+        with contextlib.redirect_stdout(io.StringIO()):
+            Lox(engine).run(SOURCE)
+
+
+def compiled(engine, requests):
+    script = program.compile(SOURCE, engine)
+    for _ in range(requests):
+        script.run()
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--engine", default="tree")
+    arg_parser.add_argument("--requests", type=int, default=2000)
+    options = arg_parser.parse_args(args)
+
+    print(f"engine {options.engine}, {options.requests} requests")
+    for name, serve in (("Lox.run", per_request), ("Program.run", compiled)):
+        start = time.perf_counter()
+        serve(options.engine, options.requests)
+        elapsed = time.perf_counter() - start
+        print(f"  {name:12} {elapsed * 1000:8.1f}ms  {elapsed * 1e6 / options.requests:8.1f}us/request")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
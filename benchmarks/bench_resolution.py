@@ -0,0 +1,119 @@
+"""
+Compares reading resolver results from the nodes themselves against the old
+`Interpreter.locals` side table, which was keyed by the (structurally hashed)
+expression nodes. Assignments of deep expressions are the worst case for the
+side table: hashing an `Assign` hashes its entire value subtree.
+
+    python benchmarks/bench_resolution.py [--depth D] [--iterations N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from interpreter import Interpreter  # noqa: E402
+from parser import Parser  # noqa: E402
+from resolver import Resolver  # noqa: E402
+from scanner import Scanner  # noqa: E402
+
+
+def deep_assignment_program(depth, iterations):
+    expression = "x"
+    for i in range(depth):
+        expression = f"({expression} + {i % 3})" if i % 2 == 0 else f"({expression} - {i % 3})"
+    return f"""
+fun run(n) {{
+    var x = 0;
+    var i = 0;
+    while (i < n) {{
+        x = {expression};
+        i = i + 1;
+    }}
+    return x;
+}}
+print(run({iterations}));
+"""
+
+
+class SideTableResolver(Resolver):
+    """Also records every resolution in a dict, the way `Interpreter.resolve` used to."""
+
+    def __init__(self, report):
+        super().__init__(report)
+        self.table = {}
+
+    def resolve_local(self, expr, name):
+        super().resolve_local(expr, name)
+        if expr.depth is not None:
+            self.table[expr] = (expr.depth, expr.slot)
+
+
+class SideTableInterpreter(Interpreter):
+    def __init__(self, report, table):
+        super().__init__(report)
+        self.table = table
+
+    def lookup_variable(self, name, expression):
+        resolved = self.table.get(expression)
+        if resolved is None:
+            return self.global_env.get(name)
+        distance, slot = resolved
+        return self.environment.ancestor(distance).slots[slot]
+
+    def visit_assign_expr(self, expr):
+        value = self.evaluate(expr.value)
+        resolved = self.table.get(expr)
+        if resolved is not None:
+            self.environment.assign_at(*resolved, value)
+        else:
+            self.global_env.assign(expr.name, value)
+        return value
+
+
+def fail(*args):
+    raise SystemExit(f"error: {args}")
+
+
+def time_run(make_interpreter, source, repeat):
+    best = None
+    output = None
+    for _ in range(repeat):
+        statements = Parser(Scanner(source, fail).scan_tokens(), fail).parse()
+        resolver = SideTableResolver(fail)
+        resolver.resolve(*statements)
+        interpreter = make_interpreter(resolver.table)
+
+        buffer = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(buffer):
+            interpreter.interpret(statements)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        output = buffer.getvalue()
+    return best, output
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--depth", type=int, default=40)
+    arg_parser.add_argument("--iterations", type=int, default=2000)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    options = arg_parser.parse_args(args)
+
+    source = deep_assignment_program(options.depth, options.iterations)
+    before, before_output = time_run(lambda table: SideTableInterpreter(fail, table), source, options.repeat)
+    after, after_output = time_run(lambda table: Interpreter(fail), source, options.repeat)
+    assert before_output == after_output
+
+    print(f"deep assignment, depth {options.depth}, {options.iterations} iterations")
+    print(f"  side table (before): {before * 1000:8.1f}ms")
+    print(f"  on the node (after): {after * 1000:8.1f}ms")
+    print(f"  speedup:             {before / after:8.2f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,140 @@
+"""
+Compares propagating `return` as a completion value returned from statement
+execution against the old `Return` exception raised in `visit_return_stmt`
+and caught in `LoxFunction`, on call-heavy code.
+
+    python benchmarks/bench_returns.py [--fib N] [--calls N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from interpreter import Interpreter  # noqa: E402
+from lox_function import LoxFunction  # noqa: E402
+from parser import Parser  # noqa: E402
+from resolver import Resolver  # noqa: E402
+from scanner import Scanner  # noqa: E402
+
+
+def call_heavy_program(fib, calls):
+    return f"""
+fun fib(n) {{
+    if (n < 2) return n;
+    return fib(n - 1) + fib(n - 2);
+}}
+
+fun clamp(x, low, high) {{
+    if (x < low) return low;
+    if (x > high) return high;
+    return x;
+}}
+
+fun bounds(low, high) {{
+    fun within(x) {{
+        if (x < low) return low;
+        if (x > high) return high;
+        return x;
+    }}
+    return within;
+}}
+
+var total = 0;
+var within = bounds(20, 90);
+for (var i = 0; i < {calls}; i = i + 1) {{
+    total = total + clamp(i, 10, 100) + within(i);
+}}
+
+print(fib({fib}));
+print(total);
+"""
+
+
+class ReturnException(Exception):
+    def __init__(self, value):
+        self.value = value
+
+
+class ExceptionFunction(LoxFunction):
+    def execute(self, interpreter, env):
+        try:
+            interpreter.execute_block(self.declaration.body, env)
+        except ReturnException as return_value:
+            return return_value.value
+        return None
+
+
+class ExceptionInterpreter(Interpreter):
+    """Statements return nothing and `return` unwinds by raising, as before."""
+
+    function_class = ExceptionFunction
+
+    def execute_block(self, stmts, env):
+        prev_environment = self.environment
+        try:
+            self.environment = env
+            for stmt in stmts:
+                self.execute(stmt)
+        finally:
+            self.environment = prev_environment
+
+    def visit_if_stmt(self, stmt):
+        if self.is_truthy(self.evaluate(stmt.condition)):
+            self.execute(stmt.then_branch)
+        elif stmt.else_branch is not None:
+            self.execute(stmt.else_branch)
+
+    def visit_while_stmt(self, stmt):
+        while self.is_truthy(self.evaluate(stmt.condition)):
+            self.execute(stmt.body)
+
+    def visit_return_stmt(self, stmt):
+        raise ReturnException(super().visit_return_stmt(stmt).value)
+
+
+def fail(*args):
+    raise SystemExit(f"error: {args}")
+
+
+def time_run(make_interpreter, source, repeat):
+    best = None
+    output = None
+    for _ in range(repeat):
+        statements = Parser(Scanner(source, fail).scan_tokens(), fail).parse()
+        Resolver(fail).resolve(*statements)
+        interpreter = make_interpreter()
+
+        buffer = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(buffer):
+            interpreter.interpret(statements)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        output = buffer.getvalue()
+    return best, output
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--fib", type=int, default=18)
+    arg_parser.add_argument("--calls", type=int, default=20000)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    options = arg_parser.parse_args(args)
+
+    source = call_heavy_program(options.fib, options.calls)
+    before, before_output = time_run(lambda: ExceptionInterpreter(fail), source, options.repeat)
+    after, after_output = time_run(lambda: Interpreter(fail), source, options.repeat)
+    assert before_output == after_output
+
+    print(f"fib({options.fib}) and {options.calls} calls with early returns")
+    print(f"  Return exception (before): {before * 1000:8.1f}ms")
+    print(f"  completion values (after): {after * 1000:8.1f}ms")
+    print(f"  speedup:                   {before / after:8.2f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,64 @@
+"""
+Measures lexer throughput on a large generated source, made by repeating
+the .lox programs in this directory until it reaches the requested size.
+
+    python benchmarks/bench_scanner.py [--size MB] [--repeat N]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS, "..", "src"))
+
+from scanner import Scanner  # noqa: E402
+
+
+def generated_source(size):
+    programs = []
+    for path in sorted(glob.glob(os.path.join(BENCHMARKS, "*.lox"))):
+        with open(path) as f:
+            programs.append(f.read())
+    chunk = "\n".join(programs)
+    return chunk * (size // len(chunk) + 1)
+
+
+def fail(*args):
+    raise SystemExit(f"error: {args}")
+
+
+def best_time(scan, repeat):
+    best = None
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = scan()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, count
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--size", type=float, default=4.0, help="source size in MB")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    options = arg_parser.parse_args(args)
+
+    source = generated_source(int(options.size * 1024 * 1024))
+    megabytes = len(source.encode()) / (1024 * 1024)
+
+    runs = [
+        ("scan_tokens (buffer)", lambda: len(Scanner(source, fail).scan_tokens())),
+        ("iter_tokens (lazy)  ", lambda: sum(1 for _ in Scanner(source, fail).iter_tokens())),
+    ]
+    print(f"{megabytes:.1f}MB of source")
+    for name, scan in runs:
+        elapsed, count = best_time(scan, options.repeat)
+        print(f"  {name}: {count} tokens in {elapsed * 1000:8.1f}ms, "
+              f"{count / elapsed:12,.0f} tokens/sec, {megabytes / elapsed:6.2f} MB/sec")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
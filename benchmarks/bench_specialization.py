@@ -0,0 +1,92 @@
+"""
+Compares the tree-walker with and without self-specializing Binary and Call
+nodes, on code whose types can't be proven statically: arithmetic on
+parameters and calls to functions held in variables.
+
+    python benchmarks/bench_specialization.py [--fib N] [--repeat N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from interpreter import Interpreter  # noqa: E402
+from parser import Parser  # noqa: E402
+from resolver import Resolver  # noqa: E402
+from scanner import Scanner  # noqa: E402
+from type_feedback import TypeFeedback  # noqa: E402
+from type_inference import TypeInference  # noqa: E402
+
+
+def feedback_program(fib):
+    return f"""
+fun fib(n) {{
+    if (n < 2) return n;
+    return fib(n - 1) + fib(n - 2);
+}}
+
+fun join(a, b) {{
+    return a + b;
+}}
+
+var text = "";
+for (var i = 0; i < 2000; i = i + 1) {{
+    text = join(text, "x");
+}}
+
+print(fib({fib}));
+print(text == "" or clock() > 0);
+"""
+
+
+def fail(*args):
+    raise SystemExit(f"error: {args}")
+
+
+def time_run(source, repeat):
+    best = None
+    output = None
+    for _ in range(repeat):
+        statements = Parser(Scanner(source, fail).scan_tokens(), fail).parse()
+        Resolver(fail).resolve(*statements)
+        TypeInference().infer(*statements)
+
+        buffer = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(buffer):
+            Interpreter(fail).interpret(statements)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        output = buffer.getvalue()
+    return best, output
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--fib", type=int, default=20)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    options = arg_parser.parse_args(args)
+
+    source = feedback_program(options.fib)
+    specialized, specialized_output = time_run(source, options.repeat)
+    # Treating every node as generic leaves them all on the checked path.
+    is_generic = TypeFeedback.is_generic
+    TypeFeedback.is_generic = lambda feedback: True
+    try:
+        generic, generic_output = time_run(source, options.repeat)
+    finally:
+        TypeFeedback.is_generic = is_generic
+    assert generic_output == specialized_output
+
+    print(f"fib({options.fib}) and 2000 string joins, tree-walker")
+    print(f"  generic nodes (before):     {generic * 1000:8.1f}ms")
+    print(f"  specialized nodes (after):  {specialized * 1000:8.1f}ms")
+    print(f"  speedup:                    {generic / specialized:8.2f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
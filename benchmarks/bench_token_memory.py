@@ -0,0 +1,47 @@
+"""
+Measures the memory held by the scanned tokens of a generated source,
+comparing a list of Token objects against the array backed TokenBuffer.
+
+    python benchmarks/bench_token_memory.py [--size MB]
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from bench_scanner import generated_source  # noqa: E402
+from scanner import Scanner  # noqa: E402
+
+
+def fail(*args):
+    raise SystemExit(f"error: {args}")
+
+
+def retained_bytes(scan):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    scanned = scan()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(scanned), after - before
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--size", type=float, default=1.0, help="source size in MB")
+    options = arg_parser.parse_args(args)
+
+    source = generated_source(int(options.size * 1024 * 1024))
+    count, old = retained_bytes(lambda: list(Scanner(source, fail).iter_tokens()))
+    _, new = retained_bytes(lambda: Scanner(source, fail).scan_tokens())
+
+    print(f"{count} tokens from {len(source) / (1024 * 1024):.1f}MB of source")
+    print(f"  Token list (before):  {old / count:7.1f} bytes/token")
+    print(f"  TokenBuffer (after):  {new / count:7.1f} bytes/token")
+    print(f"  reduction:            {(1 - new / old) * 100:7.1f}%")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,80 @@
+"""
+Compares running numeric loops with and without the operand types proven by
+TypeInference, for the engines that use them.
+
+    python benchmarks/bench_type_inference.py [--iterations N] [--repeat N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from closure_compiler import ClosureCompiler  # noqa: E402
+from interpreter import Interpreter  # noqa: E402
+from parser import Parser  # noqa: E402
+from resolver import Resolver  # noqa: E402
+from scanner import Scanner  # noqa: E402
+from type_inference import TypeInference  # noqa: E402
+
+
+def numeric_program(iterations):
+    return f"""
+fun run(n) {{
+    var total = 0;
+    for (var i = 0; i < n; i = i + 1) {{
+        var square = i * i;
+        if (square / 2 > i) {{
+            total = total + square - i * 3;
+        }}
+    }}
+    return total;
+}}
+print(run({iterations}));
+"""
+
+
+def fail(*args):
+    raise SystemExit(f"error: {args}")
+
+
+def time_run(engine, source, infer, repeat):
+    best = None
+    output = None
+    for _ in range(repeat):
+        statements = Parser(Scanner(source, fail).scan_tokens(), fail).parse()
+        Resolver(fail).resolve(*statements)
+        if infer:
+            TypeInference().infer(*statements)
+
+        buffer = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(buffer):
+            engine(fail).interpret(statements)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        output = buffer.getvalue()
+    return best, output
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--iterations", type=int, default=50000)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    options = arg_parser.parse_args(args)
+
+    source = numeric_program(options.iterations)
+    print(f"numeric loop, {options.iterations} iterations")
+    for name, engine in (("tree", Interpreter), ("closure", ClosureCompiler)):
+        before, before_output = time_run(engine, source, False, options.repeat)
+        after, after_output = time_run(engine, source, True, options.repeat)
+        assert before_output == after_output
+        print(f"  {name:8} checked: {before * 1000:8.1f}ms  inferred: {after * 1000:8.1f}ms  "
+              f"speedup: {before / after:5.2f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
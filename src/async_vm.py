@@ -0,0 +1,118 @@
+import asyncio
+
+from compiler import Compiler
+from errors import LoxRuntimeError
+from vm import VM, VMClosure
+
+
+class SLEEP:
+    """`sleep(seconds)`: pauses the script, letting others on the event loop run."""
+
+    @staticmethod
+    def arity():
+        return 1
+
+    @staticmethod
+    def call(interpreter, arguments):
+        seconds = arguments[0]
+        if type(seconds) is not float:
+            # The VM reports it against the call's token.
+            raise LoxRuntimeError(None, "Operand must be a number.")
+        return sleep(seconds)
+
+    @staticmethod
+    def to_string():
+        return "<native fn sleep>"
+
+
+class READ_FILE:
+    """`readFile(path)`: the file's contents, read on a worker thread, or nil if it can't be read."""
+
+    @staticmethod
+    def arity():
+        return 1
+
+    @staticmethod
+    def call(interpreter, arguments):
+        return read_file(arguments[0])
+
+    @staticmethod
+    def to_string():
+        return "<native fn readFile>"
+
+
+async def sleep(seconds):
+    await asyncio.sleep(seconds)
+    return None
+
+
+async def read_file(path):
+    if type(path) is not str:
+        return None
+    try:
+        return await asyncio.to_thread(read, path)
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def read(path):
+    with open(path, "r") as f:
+        return f.read()
+
+
+class AsyncVM(VM):
+    """
+    The bytecode VM run as a coroutine, so many scripts share one event
+    loop. Natives may return coroutines; at such a call the script awaits
+    it, and the event loop runs other tasks meanwhile. Between those points
+    a script runs exactly as on VM.
+
+    Each script needs its own AsyncVM, which holds its globals and reports
+    its runtime errors.
+    """
+
+    def __init__(self, report, meter=None):
+        super().__init__(report, meter)
+        self.globals["sleep"] = SLEEP
+        self.globals["readFile"] = READ_FILE
+
+    def interpret(self, stmts):
+        asyncio.run(self.prepare(stmts)())
+
+    def prepare(self, stmts):
+        """
+        Compiles `stmts` to bytecode and returns a coroutine function that
+        runs it against `globals` each time it is awaited, reporting any
+        runtime error.
+        """
+        proto = Compiler(self.meter is not None).compile(stmts)
+
+        async def run():
+            try:
+                await self.run_async(VMClosure(proto, []))
+            except LoxRuntimeError as ir:
+                self.report(ir)
+        return run
+
+    async def run_async(self, script: VMClosure):
+        """
+        Runs `script` to completion, awaiting the coroutines natives return,
+        and returns its result. With a metered deadline, a wait that would
+        outlast it is cut short with LimitExceeded.
+        """
+        steps = self.execute(script)
+        value = None
+        while True:
+            try:
+                pending, token = steps.send(value)
+            except StopIteration as done:
+                return done.value
+            time_left = None if self.meter is None else self.meter.time_left()
+            if time_left is None:
+                value = await pending
+                continue
+            try:
+                value = await asyncio.wait_for(pending, time_left)
+            except asyncio.TimeoutError:
+                steps.close()
+                raise self.meter.out_of_time(token) from None
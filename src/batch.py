@@ -0,0 +1,126 @@
+import contextlib
+import io
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+import lox
+from metering import Meter
+from program_cache import ProgramCache
+
+
+def script_paths(target):
+    """
+    The scripts to run for `target`: every `.lox` file under a directory,
+    or the paths listed one per line in a manifest file, relative to the
+    manifest. Blank lines and lines starting with `#` are skipped.
+    """
+    if os.path.isdir(target):
+        paths = []
+        for directory, subdirectories, files in os.walk(target):
+            subdirectories.sort()
+            paths.extend(os.path.join(directory, name) for name in sorted(files) if name.endswith(".lox"))
+        return paths
+
+    base = os.path.dirname(target)
+    with open(target, "r") as f:
+        lines = [line.strip() for line in f]
+    return [os.path.join(base, line) for line in lines if line and not line.startswith("#")]
+
+
+class Worker:
+    """
+    Runs scripts in a pool process. The process imports every interpreter
+    module once, when it starts, so a script only pays for its own run.
+    Each script gets a fresh Lox, as it would from `lox.py script`, metered
+    if there is a step budget or timeout.
+    """
+
+    def __init__(self, engine, optimize, compile_cache, compile_cache_dir, max_steps=None, timeout=None):
+        self.engine = engine
+        self.optimize = optimize
+        self.compile_cache = compile_cache
+        self.compile_cache_dir = compile_cache_dir
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.caches = {}
+
+    def cache_for(self, path):
+        if not self.compile_cache:
+            return None
+        directory = self.compile_cache_dir
+        if directory is None:
+            directory = os.path.join(os.path.dirname(os.path.abspath(path)), "__loxcache__")
+        cache = self.caches.get(directory)
+        if cache is None:
+            cache = self.caches[directory] = ProgramCache(directory)
+        return cache
+
+    def __call__(self, path):
+        """Returns (path, output, status, seconds, steps or None, traceback or None)."""
+        output = io.StringIO()
+        status = 0
+        crash = None
+        meter = None
+        if self.max_steps is not None or self.timeout is not None:
+            meter = Meter(self.max_steps, self.timeout)
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(output):
+                lox.Lox(self.engine, compile_cache=self.cache_for(path), optimize=self.optimize,
+                        meter=meter).run_file(path)
+        except SystemExit as e:
+            status = e.code
+        except Exception:
+            status = 1
+            crash = traceback.format_exc()
+        elapsed = time.perf_counter() - start
+        steps = meter.steps if meter is not None else None
+        return path, output.getvalue(), status, elapsed, steps, crash
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_batch(target, jobs=None, engine="tree", optimize=False, compile_cache=False, compile_cache_dir=None,
+              max_steps=None, timeout=None, out=sys.stdout, report=sys.stderr):
+    """
+    Runs the scripts `target` names on a pool of `jobs` worker processes
+    (default: one per core). Each script's output is written to `out` under
+    a `==> path (exit N, T ms) <==` header, in the order the scripts were
+    listed, with the statements it executed when `max_steps` or `timeout`
+    limits it; the totals, throughput and latencies go to `report`. Returns
+    0 if every script exited with 0 and 1 otherwise.
+    """
+    paths = script_paths(target)
+    if not paths:
+        print(f"No scripts found in {target}.", file=report)
+        return 1
+    jobs = min(jobs or os.cpu_count() or 1, len(paths))
+    worker = Worker(engine, optimize, compile_cache, compile_cache_dir, max_steps, timeout)
+
+    latencies = []
+    failed = 0
+    start = time.perf_counter()
+    with multiprocessing.Pool(jobs) as pool:
+        for path, output, status, elapsed, steps, crash in pool.imap(worker, paths):
+            latencies.append(elapsed)
+            if status != 0:
+                failed += 1
+            cost = f", {steps} steps" if steps is not None else ""
+            print(f"==> {path} (exit {status}, {elapsed * 1000:.1f}ms{cost}) <==", file=out)
+            out.write(output)
+            if crash is not None:
+                report.write(f"{path}:\n{crash}")
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{len(paths)} scripts, {failed} failed, in {wall:.2f}s with -j {jobs}: "
+          f"{len(paths) / wall:.1f} scripts/s", file=report)
+    print(f"latency: mean {sum(latencies) / len(latencies) * 1000:.1f}ms, "
+          f"p50 {percentile(latencies, 0.5) * 1000:.1f}ms, p90 {percentile(latencies, 0.9) * 1000:.1f}ms, "
+          f"max {latencies[-1] * 1000:.1f}ms", file=report)
+    return 1 if failed else 0
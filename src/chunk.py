@@ -0,0 +1,96 @@
+class Chunk:
+    """
+    Bytecode for a single function. Every instruction is two slots wide in
+    `code`: the opcode followed by its operand (0 when unused). The token of
+    the source construct that produced an instruction is kept at the same
+    index in `tokens` so runtime errors can be reported against it.
+    """
+
+    def __init__(self):
+        self.code = []
+        self.tokens = []
+        self.constants = []
+        self.constant_index = {}
+
+    def emit(self, op, arg=0, token=None):
+        self.code.append(op)
+        self.code.append(arg)
+        self.tokens.append(token)
+        self.tokens.append(None)
+        return len(self.code) - 2
+
+    def patch(self, offset, arg):
+        self.code[offset + 1] = arg
+
+    def add_constant(self, value):
+        key = (type(value), value)
+        index = self.constant_index.get(key)
+        if index is None:
+            index = len(self.constants)
+            self.constants.append(value)
+            self.constant_index[key] = index
+        return index
+
+    def __len__(self):
+        return len(self.code)
+
+
+class FunctionProto:
+    def __init__(self, name, arity=0):
+        self.name = name
+        self.arity = arity
+        self.chunk = Chunk()
+        self.upvalues = []
+
+    def to_string(self):
+        if self.name is None:
+            return "<script>"
+        return f"<fn {self.name}>"
+
+
+CONSTANT = 0
+NIL = 1
+TRUE = 2
+FALSE = 3
+POP = 4
+GET_LOCAL = 5
+SET_LOCAL = 6
+GET_GLOBAL = 7
+DEFINE_GLOBAL = 8
+SET_GLOBAL = 9
+GET_UPVALUE = 10
+SET_UPVALUE = 11
+GET_PROPERTY = 12
+SET_PROPERTY = 13
+GET_SUPER = 14
+EQUAL = 15
+NOT_EQUAL = 16
+GREATER = 17
+GREATER_EQUAL = 18
+LESS = 19
+LESS_EQUAL = 20
+ADD = 21
+SUBTRACT = 22
+MULTIPLY = 23
+DIVIDE = 24
+NOT = 25
+NEGATE = 26
+PRINT = 27
+JUMP = 28
+JUMP_IF_FALSE = 29
+JUMP_IF_TRUE = 30
+POP_JUMP_IF_FALSE = 31
+CALL = 32
+INVOKE = 33
+SUPER_INVOKE = 34
+CLOSURE = 35
+CLOSE_UPVALUE = 36
+RETURN = 37
+CLASS = 38
+INHERIT = 39
+METHOD = 40
+# Counts a statement against the VM's meter; only emitted when metering.
+STEP = 41
+# Raises unless the value on top of the stack is an instance, so a property
+# set or method call fails before its value or arguments are evaluated.
+CHECK_INSTANCE = 42
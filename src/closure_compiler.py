@@ -0,0 +1,568 @@
+import operator
+
+import expressions as Expr
+import statements as Stmt
+import tokens
+from environment import Cell, Environment, GlobalEnvironment, capture
+from errors import LoxRuntimeError
+from interpreter import CLOCK, PRINT, UNCHECKED_OPERATORS
+from lox_class import LoxClass, LoxInstance
+from lox_function import BoundMethod, LoxFunction, Return
+
+NUMERIC_OPERATORS = {
+    tokens.MINUS: operator.sub,
+    tokens.STAR: operator.mul,
+    tokens.SLASH: operator.truediv,
+    tokens.GREATER: operator.gt,
+    tokens.GREATER_EQUAL: operator.ge,
+    tokens.LESS: operator.lt,
+    tokens.LESS_EQUAL: operator.le,
+}
+
+
+class CompiledFunction(LoxFunction):
+    """A `LoxFunction` whose body has been compiled into a closure."""
+
+    def __init__(self, declaration: Stmt.Function, cells, body, is_initializer=False):
+        super().__init__(declaration, cells, is_initializer)
+        self.body = body
+
+    def execute(self, interpreter, env):
+        completion = self.body(env)
+        if type(completion) is Return:
+            return completion.value
+        return None
+
+
+class ClosureCompiler:
+    """
+    Execution engine that walks each resolved statement once, turning every
+    node into a Python closure with its operator, resolved depth and
+    constants baked in. Running a program is then a matter of calling the
+    closures with the current `Environment`, without any visitor dispatch.
+
+    Compiled statements return a `Return` when a return statement ran and
+    anything else otherwise; expression statements are left returning their
+    value rather than being wrapped to discard it.
+    """
+
+    # Where `print` writes to; None for stdout.
+    output = None
+
+    def __init__(self, report, meter=None):
+        self.report = report
+        self.global_env = GlobalEnvironment()
+        self.scope_depth = 0
+        # Only a metered compiler wraps statements to count them.
+        self.meter = meter
+        if meter is not None:
+            self.compile = self.metered_compile
+
+        self.global_env.define(tokens.Token(tokens.IDENTIFIER, "clock", "clock", -1), CLOCK)
+        self.global_env.define(tokens.Token(tokens.IDENTIFIER, "print", "print", -1), PRINT)
+
+    def interpret(self, stmts: [Stmt.Stmt]):
+        self.prepare(stmts)()
+
+    def prepare(self, stmts: [Stmt.Stmt]):
+        """
+        Compiles `stmts` and returns a function that runs them against this
+        engine's globals each time it is called, reporting any runtime
+        error. The compiled closures look globals up in `global_env.values`
+        itself, so that dict must be updated in place, not replaced.
+        """
+        compiled = [self.compile(stmt) for stmt in stmts]
+
+        def run_all():
+            try:
+                for run in compiled:
+                    run(self.global_env)
+            except LoxRuntimeError as ir:
+                self.report(ir)
+        return run_all
+
+    def compile(self, node):
+        return node.accept(self)
+
+    def metered_compile(self, node):
+        run = node.accept(self)
+        if not isinstance(node, Stmt.Stmt):
+            return run
+        meter = self.meter
+
+        def metered(env):
+            meter.steps += 1
+            if meter.steps >= meter.limit:
+                meter.check(node)
+            return run(env)
+        return metered
+
+    def compile_scope(self, stmts: [Stmt.Stmt]):
+        self.scope_depth += 1
+        try:
+            return self.compile_block(stmts)
+        finally:
+            self.scope_depth -= 1
+
+    def compile_block(self, stmts: [Stmt.Stmt]):
+        compiled = tuple(self.compile(stmt) for stmt in stmts)
+        if len(compiled) == 1:
+            return compiled[0]
+
+        def run(env):
+            for stmt in compiled:
+                completion = stmt(env)
+                if type(completion) is Return:
+                    return completion
+        return run
+
+    def compile_lookup(self, name: tokens.Token, expr: Expr.Resolvable):
+        lexeme = name.lexeme
+        distance = expr.depth
+        if distance is None:
+            upvalue = expr.upvalue
+            if upvalue is not None:
+                return lambda env: env.cells[upvalue].value
+
+            values = self.global_env.values
+
+            def lookup(env):
+                try:
+                    return values[lexeme]
+                except KeyError:
+                    raise LoxRuntimeError(name, f"Undefined Variable '{lexeme}'.")
+            return lookup
+
+        slot = expr.slot
+        if expr.cell:
+            if distance == 0:
+                return lambda env: env.slots[slot].value
+            return lambda env: env.ancestor(distance).slots[slot].value
+        if distance == 0:
+            return lambda env: env.slots[slot]
+        if distance == 1:
+            return lambda env: env.parent.slots[slot]
+        return lambda env: env.ancestor(distance).slots[slot]
+
+    def compile_define(self, name: tokens.Token, captured=False):
+        """
+        Returns a function that binds a value to `name` in the scope being
+        compiled, in a new cell if the variable is `captured`.
+        """
+        if self.scope_depth == 0:
+            values = self.global_env.values
+            lexeme = name.lexeme
+
+            def define_global(env, value):
+                values[lexeme] = value
+            return define_global
+
+        if captured:
+            return lambda env, value: env.slots.append(Cell(value))
+        return lambda env, value: env.slots.append(value)
+
+    def compile_function(self, stmt: Stmt.Function):
+        return self.compile_scope(stmt.body)
+
+    def visit_block_stmt(self, stmt: Stmt.Block):
+        body = self.compile_scope(stmt.statements)
+        if stmt.environment == Stmt.NO_ENVIRONMENT:
+            return body
+
+        if stmt.environment == Stmt.ENCLOSING_ENVIRONMENT:
+            def run(env):
+                slots = env.slots
+                size = len(slots)
+                try:
+                    return body(env)
+                finally:
+                    del slots[size:]
+            return run
+
+        def run(env):
+            return body(Environment(env))
+        return run
+
+    def visit_class_stmt(self, stmt: Stmt.Class):
+        name = stmt.name
+        captured = stmt.captured
+        define = self.compile_define(name, captured)
+        superclass_expr = stmt.superclass
+        superclass_lookup = None
+        if superclass_expr is not None:
+            superclass_lookup = self.compile(superclass_expr)
+        methods = [(method, self.compile_function(method)) for method in stmt.methods]
+
+        def run(env):
+            # A captured class is defined before its methods are created,
+            # as they may capture it.
+            if captured:
+                define(env, None)
+
+            superclass = None
+            if superclass_lookup is not None:
+                superclass = superclass_lookup(env)
+                if not isinstance(superclass, LoxClass):
+                    raise LoxRuntimeError(superclass_expr.name, "Superclass must be a class.")
+
+            method_env = env
+            if superclass is not None:
+                method_env = Environment(env, [Cell(superclass)])
+
+            functions = {}
+            for method, body in methods:
+                is_initializer = method.name.lexeme == "init"
+                cells = capture(method_env, method.upvalues)
+                functions[method.name.lexeme] = CompiledFunction(method, cells, body, is_initializer)
+            klass = LoxClass(name, superclass, functions)
+            if captured:
+                env.slots[-1].value = klass
+            else:
+                define(env, klass)
+        return run
+
+    def visit_expression_stmt(self, stmt: Stmt.Expression):
+        # The value of an expression statement is discarded by its caller.
+        return self.compile(stmt.expression)
+
+    def visit_function_stmt(self, stmt: Stmt.Function):
+        define = self.compile_define(stmt.name, stmt.captured)
+        body = self.compile_function(stmt)
+        upvalues = stmt.upvalues
+
+        if stmt.captured:
+            # Defined first, so the function can capture itself.
+            def run(env):
+                define(env, None)
+                env.slots[-1].value = CompiledFunction(stmt, capture(env, upvalues), body)
+            return run
+
+        def run(env):
+            define(env, CompiledFunction(stmt, capture(env, upvalues), body))
+        return run
+
+    def visit_if_stmt(self, stmt: Stmt.If):
+        condition = self.compile(stmt.condition)
+        then_branch = self.compile(stmt.then_branch)
+        if stmt.else_branch is None:
+            def run(env):
+                value = condition(env)
+                if value is not None and value is not False:
+                    return then_branch(env)
+            return run
+
+        else_branch = self.compile(stmt.else_branch)
+
+        def run(env):
+            value = condition(env)
+            if value is not None and value is not False:
+                return then_branch(env)
+            return else_branch(env)
+        return run
+
+    def visit_print_stmt(self, stmt: Stmt.Print):
+        expression = self.compile(stmt.expression)
+
+        def run(env):
+            value = expression(env)
+            if hasattr(value, "to_string") and callable(value.to_string):
+                value = value.to_string()
+            print(value, file=self.output)
+        return run
+
+    def visit_return_stmt(self, stmt: Stmt.Return):
+        if stmt.value is None:
+            def run(env):
+                return Return(None)
+            return run
+
+        if stmt.tail_call:
+            value = self.visit_call_expr(stmt.value, tail=True)
+        else:
+            value = self.compile(stmt.value)
+
+        def run(env):
+            return Return(value(env))
+        return run
+
+    def visit_var_stmt(self, stmt: Stmt.Var):
+        define = self.compile_define(stmt.name, stmt.captured)
+        if stmt.initializer is None:
+            return lambda env: define(env, None)
+
+        initializer = self.compile(stmt.initializer)
+
+        def run(env):
+            define(env, initializer(env))
+        return run
+
+    def visit_while_stmt(self, stmt: Stmt.While):
+        condition = self.compile(stmt.condition)
+        body = self.compile(stmt.body)
+
+        def run(env):
+            value = condition(env)
+            while value is not None and value is not False:
+                completion = body(env)
+                if type(completion) is Return:
+                    return completion
+                value = condition(env)
+        return run
+
+    def visit_assign_expr(self, expr: Expr.Assign):
+        name = expr.name
+        lexeme = name.lexeme
+        value_fn = self.compile(expr.value)
+        distance = expr.depth
+        if distance is None:
+            upvalue = expr.upvalue
+            if upvalue is not None:
+                def assign_upvalue(env):
+                    value = env.cells[upvalue].value = value_fn(env)
+                    return value
+                return assign_upvalue
+
+            values = self.global_env.values
+
+            def assign(env):
+                value = value_fn(env)
+                if lexeme not in values:
+                    raise LoxRuntimeError(name, f"Undefined Variable '{lexeme}'.")
+                values[lexeme] = value
+                return value
+            return assign
+
+        slot = expr.slot
+        if expr.cell:
+            def assign_cell(env):
+                value = env.ancestor(distance).slots[slot].value = value_fn(env)
+                return value
+            return assign_cell
+
+        if distance == 0:
+            def assign_local(env):
+                value = env.slots[slot] = value_fn(env)
+                return value
+            return assign_local
+
+        def assign(env):
+            value = env.ancestor(distance).slots[slot] = value_fn(env)
+            return value
+        return assign
+
+    def visit_binary_expr(self, expr: Expr.Binary):
+        operator_token = expr.operator
+        token_type = operator_token.token_type
+        left = self.compile(expr.left)
+        right = self.compile(expr.right)
+
+        if expr.operand_type is not None:
+            operation = UNCHECKED_OPERATORS[token_type]
+            return lambda env: operation(left(env), right(env))
+        if token_type == tokens.PLUS:
+            def add(env):
+                a = left(env)
+                b = right(env)
+                if type(a) is float and type(b) is float or type(a) is str and type(b) is str:
+                    return a + b
+                raise LoxRuntimeError(operator_token, "Operands must both be either strings or numbers")
+            return add
+
+        if token_type == tokens.EQUAL_EQUAL:
+            return lambda env: left(env) == right(env)
+        if token_type == tokens.BANG_EQUAL:
+            return lambda env: not left(env) == right(env)
+
+        operation = NUMERIC_OPERATORS[token_type]
+        if isinstance(expr.right, Expr.Literal) and type(expr.right.value) is float:
+            constant = expr.right.value
+
+            def numeric_constant(env):
+                a = left(env)
+                if type(a) is not float:
+                    raise LoxRuntimeError(operator_token, "Operand must be a number.")
+                return operation(a, constant)
+            return numeric_constant
+
+        def numeric(env):
+            a = left(env)
+            b = right(env)
+            if type(a) is not float or type(b) is not float:
+                raise LoxRuntimeError(operator_token, "Operand must be a number.")
+            return operation(a, b)
+        return numeric
+
+    def visit_call_expr(self, expr: Expr.Call, tail=False):
+        argument_fns = tuple(self.compile(argument) for argument in expr.arguments)
+        paren = expr.paren
+
+        def call_value(callee, env):
+            arguments = [argument(env) for argument in argument_fns]
+
+            if not hasattr(callee, "call") or not callable(callee.call):
+                raise LoxRuntimeError(paren, "Can only call functions and classes.")
+
+            if len(arguments) != callee.arity():
+                raise LoxRuntimeError(paren, "Wrong number of arguments.")
+
+            if tail and isinstance(callee, (LoxFunction, BoundMethod)):
+                return callee.tail_call(arguments)
+            return callee.call(self, arguments)
+
+        def call_method(obj, method, env):
+            arguments = [argument(env) for argument in argument_fns]
+            if len(arguments) != method.arity():
+                raise LoxRuntimeError(paren, "Wrong number of arguments.")
+            if tail:
+                return method.tail_invoke(obj, arguments)
+            return method.invoke(self, obj, arguments)
+
+        if type(expr.callee) is Expr.Get:
+            return self.compile_invoke(expr.callee, call_value, call_method)
+        if type(expr.callee) is Expr.Super:
+            return self.compile_invoke_super(expr.callee, call_method)
+
+        callee_fn = self.compile(expr.callee)
+        return lambda env: call_value(callee_fn(env), env)
+
+    def compile_invoke(self, get: Expr.Get, call_value, call_method):
+        obj_fn = self.compile(get.object)
+        name = get.name
+        cache = get.cache
+
+        def invoke(env):
+            obj = obj_fn(env)
+            if not isinstance(obj, LoxInstance):
+                raise LoxRuntimeError(name, "Only instances have properties")
+            if cache.shape is obj.shape:
+                cache.hits += 1
+                offset, method = cache.offset, cache.target
+            else:
+                offset, method = cache.get_miss(obj, name)
+            if offset is not None:
+                return call_value(obj.values[offset], env)
+            return call_method(obj, method, env)
+        return invoke
+
+    def compile_invoke_super(self, sup: Expr.Super, call_method):
+        superclass_lookup = self.compile_lookup(sup.keyword, sup)
+        this_lookup = self.compile(sup.this)
+        method_name = sup.method
+
+        def invoke_super(env):
+            superclass = superclass_lookup(env)
+            obj = this_lookup(env)
+            method = superclass.find_method(method_name.lexeme)
+            if method is None:
+                raise LoxRuntimeError(method_name, f"Undefined property {method_name.lexeme}.")
+            return call_method(obj, method, env)
+        return invoke_super
+
+    def visit_get_expr(self, expr: Expr.Get):
+        obj_fn = self.compile(expr.object)
+        name = expr.name
+        cache = expr.cache
+
+        def get(env):
+            obj = obj_fn(env)
+            if not isinstance(obj, LoxInstance):
+                raise LoxRuntimeError(name, "Only instances have properties")
+            if cache.shape is obj.shape:
+                cache.hits += 1
+                offset, method = cache.offset, cache.target
+            else:
+                offset, method = cache.get_miss(obj, name)
+            if offset is not None:
+                return obj.values[offset]
+            return method.bind(obj)
+        return get
+
+    def visit_grouping_expr(self, expr: Expr.Grouping):
+        return self.compile(expr.expression)
+
+    def visit_literal_expr(self, expr: Expr.Literal):
+        value = expr.value
+        return lambda env: value
+
+    def visit_logical_expr(self, expr: Expr.Logical):
+        left = self.compile(expr.left)
+        right = self.compile(expr.right)
+
+        if expr.operator.token_type == tokens.OR:
+            def logical_or(env):
+                value = left(env)
+                if value is not None and value is not False:
+                    return value
+                return right(env)
+            return logical_or
+
+        def logical_and(env):
+            value = left(env)
+            if value is None or value is False:
+                return value
+            return right(env)
+        return logical_and
+
+    def visit_set_expr(self, expr: Expr.Set):
+        obj_fn = self.compile(expr.object)
+        value_fn = self.compile(expr.value)
+        name = expr.name
+        cache = expr.cache
+
+        def set_property(env):
+            obj = obj_fn(env)
+            if not isinstance(obj, LoxInstance):
+                raise LoxRuntimeError(name, "Only instances have properties")
+            value = value_fn(env)
+            if cache.shape is obj.shape:
+                cache.hits += 1
+                offset, shape = cache.offset, cache.target
+            else:
+                offset, shape = cache.set_miss(obj, name)
+            if offset is not None:
+                obj.values[offset] = value
+            else:
+                obj.shape = shape
+                obj.values.append(value)
+        return set_property
+
+    def visit_super_expr(self, expr: Expr.Super):
+        superclass_lookup = self.compile_lookup(expr.keyword, expr)
+        this_lookup = self.compile(expr.this)
+        method_name = expr.method
+
+        def get_super(env):
+            superclass = superclass_lookup(env)
+            obj = this_lookup(env)
+            method = superclass.find_method(method_name.lexeme)
+            if method is None:
+                raise LoxRuntimeError(method_name, f"Undefined property {method_name.lexeme}.")
+            return method.bind(obj)
+        return get_super
+
+    def visit_this_expr(self, expr: Expr.This):
+        return self.compile_lookup(expr.keyword, expr)
+
+    def visit_unary_expr(self, expr: Expr.Unary):
+        operator_token = expr.operator
+        right = self.compile(expr.right)
+        if expr.operand_type is not None:
+            return lambda env: -right(env)
+        if operator_token.token_type == tokens.MINUS:
+            def negate(env):
+                value = right(env)
+                if type(value) is not float:
+                    raise LoxRuntimeError(operator_token, "Operand must be a number.")
+                return -value
+            return negate
+
+        if operator_token.token_type == tokens.BANG:
+            def logical_not(env):
+                value = right(env)
+                return value is None or value is False
+            return logical_not
+
+        return lambda env: None
+
+    def visit_variable_expr(self, expr: Expr.Variable):
+        return self.compile_lookup(expr.name, expr)
@@ -0,0 +1,346 @@
+import chunk as op
+import expressions as Expr
+import statements as Stmt
+import tokens
+from chunk import FunctionProto
+from metering import first_token
+from tokens import Token
+
+TYPE_SCRIPT = 0
+TYPE_FUNCTION = 1
+TYPE_METHOD = 2
+TYPE_INITIALIZER = 3
+
+BINARY_OPCODES = {
+    tokens.PLUS: op.ADD,
+    tokens.MINUS: op.SUBTRACT,
+    tokens.STAR: op.MULTIPLY,
+    tokens.SLASH: op.DIVIDE,
+    tokens.GREATER: op.GREATER,
+    tokens.GREATER_EQUAL: op.GREATER_EQUAL,
+    tokens.LESS: op.LESS,
+    tokens.LESS_EQUAL: op.LESS_EQUAL,
+    tokens.EQUAL_EQUAL: op.EQUAL,
+    tokens.BANG_EQUAL: op.NOT_EQUAL,
+}
+
+
+def this_token(keyword):
+    return Token(tokens.THIS, "this", "this", keyword.line)
+
+
+class Local:
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.is_captured = False
+
+
+class FunctionState:
+    def __init__(self, enclosing, proto: FunctionProto, function_type):
+        self.enclosing = enclosing
+        self.proto = proto
+        self.function_type = function_type
+        self.scope_depth = 0
+        # Slot zero holds the callee, or the receiver inside methods.
+        receiver = "this" if function_type in (TYPE_METHOD, TYPE_INITIALIZER) else ""
+        self.locals = [Local(receiver, 0)]
+
+    def resolve_local(self, name):
+        for i in range(len(self.locals) - 1, -1, -1):
+            if self.locals[i].name == name:
+                return i
+        return None
+
+    def add_upvalue(self, is_local, index):
+        upvalue = (is_local, index)
+        upvalues = self.proto.upvalues
+        if upvalue in upvalues:
+            return upvalues.index(upvalue)
+        upvalues.append(upvalue)
+        return len(upvalues) - 1
+
+    def resolve_upvalue(self, name):
+        if self.enclosing is None:
+            return None
+
+        local = self.enclosing.resolve_local(name)
+        if local is not None:
+            self.enclosing.locals[local].is_captured = True
+            return self.add_upvalue(True, local)
+
+        upvalue = self.enclosing.resolve_upvalue(name)
+        if upvalue is not None:
+            return self.add_upvalue(False, upvalue)
+
+        return None
+
+
+class Compiler:
+    """
+    Compiles resolved statements into bytecode for the `VM`. The `Resolver`
+    has already rejected invalid programs, so the compiler only tracks enough
+    scope information to place locals in stack slots and to find upvalues.
+    """
+
+    def __init__(self, metered=False):
+        self.state: FunctionState = None
+        self.metered = metered
+
+    def compile(self, statements) -> FunctionProto:
+        self.state = FunctionState(None, FunctionProto(None), TYPE_SCRIPT)
+        for statement in statements:
+            self.statement(statement)
+        self.emit_return(None)
+        proto = self.state.proto
+        self.state = None
+        return proto
+
+    @property
+    def chunk(self):
+        return self.state.proto.chunk
+
+    def statement(self, stmt: Stmt.Stmt):
+        if self.metered:
+            self.emit(op.STEP, 0, first_token(stmt))
+        stmt.accept(self)
+
+    def emit(self, opcode, arg=0, token=None):
+        return self.chunk.emit(opcode, arg, token)
+
+    def receiver(self, obj, name):
+        obj.accept(self)
+        # `this` is always an instance.
+        if not isinstance(obj, Expr.This):
+            self.emit(op.CHECK_INSTANCE, 0, name)
+
+    def emit_constant(self, value):
+        self.emit(op.CONSTANT, self.chunk.add_constant(value))
+
+    def emit_jump(self, opcode, token=None):
+        return self.emit(opcode, -1, token)
+
+    def patch_jump(self, offset):
+        self.chunk.patch(offset, len(self.chunk))
+
+    def emit_return(self, token):
+        if self.state.function_type == TYPE_INITIALIZER:
+            self.emit(op.GET_LOCAL, 0)
+        else:
+            self.emit(op.NIL)
+        self.emit(op.RETURN, 0, token)
+
+    def identifier_constant(self, name):
+        return self.chunk.add_constant(name.lexeme)
+
+    def begin_scope(self):
+        self.state.scope_depth += 1
+
+    def end_scope(self):
+        state = self.state
+        state.scope_depth -= 1
+        while state.locals and state.locals[-1].depth > state.scope_depth:
+            if state.locals[-1].is_captured:
+                self.emit(op.CLOSE_UPVALUE)
+            else:
+                self.emit(op.POP)
+            state.locals.pop()
+
+    def is_local_scope(self):
+        return self.state.scope_depth > 0
+
+    def add_local(self, name):
+        self.state.locals.append(Local(name, self.state.scope_depth))
+
+    def define_variable(self, name):
+        """Binds the value on top of the stack to `name` in the current scope."""
+        if self.is_local_scope():
+            self.add_local(name.lexeme)
+        else:
+            self.emit(op.DEFINE_GLOBAL, self.identifier_constant(name), name)
+
+    def named_variable(self, name, assign=False):
+        state = self.state
+        slot = state.resolve_local(name.lexeme)
+        if slot is not None:
+            self.emit(op.SET_LOCAL if assign else op.GET_LOCAL, slot, name)
+            return
+
+        upvalue = state.resolve_upvalue(name.lexeme)
+        if upvalue is not None:
+            self.emit(op.SET_UPVALUE if assign else op.GET_UPVALUE, upvalue, name)
+            return
+
+        self.emit(op.SET_GLOBAL if assign else op.GET_GLOBAL, self.identifier_constant(name), name)
+
+    def function(self, stmt: Stmt.Function, function_type):
+        proto = FunctionProto(stmt.name.lexeme, len(stmt.params))
+        self.state = FunctionState(self.state, proto, function_type)
+        self.begin_scope()
+        for param in stmt.params:
+            self.add_local(param.lexeme)
+        for statement in stmt.body:
+            self.statement(statement)
+        self.emit_return(None)
+        self.state = self.state.enclosing
+
+        self.emit(op.CLOSURE, self.chunk.add_constant(proto), stmt.name)
+
+    def visit_block_stmt(self, stmt: Stmt.Block):
+        self.begin_scope()
+        for statement in stmt.statements:
+            self.statement(statement)
+        self.end_scope()
+
+    def visit_class_stmt(self, stmt: Stmt.Class):
+        self.emit(op.CLASS, self.identifier_constant(stmt.name), stmt.name)
+        self.define_variable(stmt.name)
+
+        if stmt.superclass is not None:
+            stmt.superclass.accept(self)
+            self.begin_scope()
+            self.add_local("super")
+            self.named_variable(stmt.name)
+            self.emit(op.INHERIT, 0, stmt.superclass.name)
+
+        self.named_variable(stmt.name)
+        for method in stmt.methods:
+            function_type = TYPE_INITIALIZER if method.name.lexeme == "init" else TYPE_METHOD
+            self.function(method, function_type)
+            self.emit(op.METHOD, self.identifier_constant(method.name))
+        self.emit(op.POP)
+
+        if stmt.superclass is not None:
+            self.end_scope()
+
+    def visit_expression_stmt(self, stmt: Stmt.Expression):
+        stmt.expression.accept(self)
+        self.emit(op.POP)
+
+    def visit_function_stmt(self, stmt: Stmt.Function):
+        if self.is_local_scope():
+            # Declared before the body is compiled so the function can recurse.
+            self.add_local(stmt.name.lexeme)
+            self.function(stmt, TYPE_FUNCTION)
+        else:
+            self.function(stmt, TYPE_FUNCTION)
+            self.define_variable(stmt.name)
+
+    def visit_if_stmt(self, stmt: Stmt.If):
+        stmt.condition.accept(self)
+        then_jump = self.emit_jump(op.POP_JUMP_IF_FALSE)
+        self.statement(stmt.then_branch)
+        if stmt.else_branch is None:
+            self.patch_jump(then_jump)
+            return
+        else_jump = self.emit_jump(op.JUMP)
+        self.patch_jump(then_jump)
+        self.statement(stmt.else_branch)
+        self.patch_jump(else_jump)
+
+    def visit_print_stmt(self, stmt: Stmt.Print):
+        stmt.expression.accept(self)
+        self.emit(op.PRINT)
+
+    def visit_return_stmt(self, stmt: Stmt.Return):
+        if stmt.value is None:
+            self.emit_return(stmt.keyword)
+        else:
+            stmt.value.accept(self)
+            self.emit(op.RETURN, 0, stmt.keyword)
+
+    def visit_var_stmt(self, stmt: Stmt.Var):
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+        else:
+            self.emit(op.NIL)
+        self.define_variable(stmt.name)
+
+    def visit_while_stmt(self, stmt: Stmt.While):
+        loop_start = len(self.chunk)
+        stmt.condition.accept(self)
+        exit_jump = self.emit_jump(op.POP_JUMP_IF_FALSE)
+        self.statement(stmt.body)
+        self.emit(op.JUMP, loop_start)
+        self.patch_jump(exit_jump)
+
+    def visit_assign_expr(self, expr: Expr.Assign):
+        expr.value.accept(self)
+        self.named_variable(expr.name, assign=True)
+
+    def visit_binary_expr(self, expr: Expr.Binary):
+        expr.left.accept(self)
+        expr.right.accept(self)
+        self.emit(BINARY_OPCODES[expr.operator.token_type], 0, expr.operator)
+
+    def visit_call_expr(self, expr: Expr.Call):
+        callee = expr.callee
+        argc = len(expr.arguments)
+        if isinstance(callee, Expr.Get):
+            self.receiver(callee.object, callee.name)
+            for argument in expr.arguments:
+                argument.accept(self)
+            name = callee.name
+            self.emit(op.INVOKE, self.chunk.add_constant((name.lexeme, argc)), name)
+        elif isinstance(callee, Expr.Super):
+            self.named_variable(this_token(callee.keyword))
+            for argument in expr.arguments:
+                argument.accept(self)
+            self.named_variable(callee.keyword)
+            name = callee.method
+            self.emit(op.SUPER_INVOKE, self.chunk.add_constant((name.lexeme, argc)), name)
+        else:
+            callee.accept(self)
+            for argument in expr.arguments:
+                argument.accept(self)
+            self.emit(op.CALL, argc, expr.paren)
+
+    def visit_get_expr(self, expr: Expr.Get):
+        expr.object.accept(self)
+        self.emit(op.GET_PROPERTY, self.identifier_constant(expr.name), expr.name)
+
+    def visit_grouping_expr(self, expr: Expr.Grouping):
+        expr.expression.accept(self)
+
+    def visit_literal_expr(self, expr: Expr.Literal):
+        if expr.value is None:
+            self.emit(op.NIL)
+        elif expr.value is True:
+            self.emit(op.TRUE)
+        elif expr.value is False:
+            self.emit(op.FALSE)
+        else:
+            self.emit_constant(expr.value)
+
+    def visit_logical_expr(self, expr: Expr.Logical):
+        expr.left.accept(self)
+        if expr.operator.token_type == tokens.OR:
+            end_jump = self.emit_jump(op.JUMP_IF_TRUE)
+        else:
+            end_jump = self.emit_jump(op.JUMP_IF_FALSE)
+        self.emit(op.POP)
+        expr.right.accept(self)
+        self.patch_jump(end_jump)
+
+    def visit_set_expr(self, expr: Expr.Set):
+        self.receiver(expr.object, expr.name)
+        expr.value.accept(self)
+        self.emit(op.SET_PROPERTY, self.identifier_constant(expr.name), expr.name)
+
+    def visit_super_expr(self, expr: Expr.Super):
+        self.named_variable(this_token(expr.keyword))
+        self.named_variable(expr.keyword)
+        self.emit(op.GET_SUPER, self.identifier_constant(expr.method), expr.method)
+
+    def visit_this_expr(self, expr: Expr.This):
+        self.named_variable(expr.keyword)
+
+    def visit_unary_expr(self, expr: Expr.Unary):
+        expr.right.accept(self)
+        if expr.operator.token_type == tokens.MINUS:
+            self.emit(op.NEGATE, 0, expr.operator)
+        else:
+            self.emit(op.NOT, 0, expr.operator)
+
+    def visit_variable_expr(self, expr: Expr.Variable):
+        self.named_variable(expr.name)
@@ -0,0 +1,188 @@
+import collections
+import contextlib
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import sys
+import threading
+import traceback
+
+import program
+from lox_client import default_socket
+from metering import Meter
+
+# Distinct sources whose compiled Programs are kept.
+PROGRAM_CACHE_SIZE = 64
+
+
+class Frames:
+    """
+    A file-like object for Program.run that sends what a script prints to
+    the client as `out` frames, one JSON object per line.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        self.send({"out": text})
+
+    def send(self, frame):
+        self.stream.write(json.dumps(frame) + "\n")
+
+    def flush(self):
+        self.stream.flush()
+
+
+class ProgramPool:
+    """
+    Compiled Programs for the most recently run sources. A Program runs one
+    script at a time, so each source keeps a list of idle Programs: a
+    request takes one, or compiles another while they are all busy, and
+    puts it back when done.
+    """
+
+    def __init__(self, engine, optimize, max_steps=None, timeout=None, size=PROGRAM_CACHE_SIZE):
+        self.engine = engine
+        self.optimize = optimize
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.size = size
+        self.idle = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def acquire(self, source):
+        with self.lock:
+            programs = self.idle.get(source)
+            if programs:
+                self.idle.move_to_end(source)
+                return programs.pop()
+        meter = None
+        if self.max_steps is not None or self.timeout is not None:
+            meter = Meter(self.max_steps, self.timeout)
+        return program.compile(source, self.engine, self.optimize, meter)
+
+    def release(self, source, compiled):
+        with self.lock:
+            self.idle.setdefault(source, []).append(compiled)
+            self.idle.move_to_end(source)
+            while len(self.idle) > self.size:
+                self.idle.popitem(last=False)
+
+
+class Handler(socketserver.StreamRequestHandler):
+    """
+    Serves one request: a JSON line naming a script, {"path": ...}, or
+    holding one, {"source": ...}. The reply is a stream of JSON lines:
+    {"out": text} for what the script prints, {"err": text} for errors
+    outside the script, and last {"status": N} with the exit status
+    `lox.py script` would give, plus "steps" executed if the daemon limits
+    them.
+    """
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            with self.connection.makefile("w", encoding="utf-8") as stream:
+                frames = Frames(stream)
+                try:
+                    status, steps = self.run(line, frames)
+                except ConnectionError:
+                    raise
+                except Exception:
+                    frames.send({"err": traceback.format_exc()})
+                    status, steps = 1, None
+                frame = {"status": status}
+                if steps is not None:
+                    frame["steps"] = steps
+                frames.send(frame)
+        except ConnectionError:
+            # The client went away; there is no one left to tell.
+            pass
+
+    def run(self, line, frames):
+        try:
+            message = json.loads(line)
+            if "source" in message:
+                source = message["source"]
+            else:
+                with open(message["path"], "r") as f:
+                    source = f.read()
+        except (ValueError, KeyError, TypeError) as e:
+            frames.send({"err": f"Bad request: {e}\n"})
+            return 2, None
+        except OSError as e:
+            frames.send({"err": f"Can't open {e.filename}: {e.strerror}\n"})
+            return 2, None
+
+        pool = self.server.programs
+        try:
+            compiled = pool.acquire(source)
+        except program.CompileError as e:
+            frames.write("".join(error + "\n" for error in e.errors))
+            return 65, None
+        result = compiled.run(output=frames)
+        pool.release(source, compiled)
+        if result.error is not None:
+            frames.write(f"{result.error.message}\n[line {result.error.token.line}]\n")
+        return result.exit_status, result.steps
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path=None, engine="tree", optimize=False, max_steps=None, timeout=None):
+    """
+    Listens on the Unix socket `socket_path` and runs each script sent to
+    it on `engine`, until interrupted, stopping any that executes more than
+    `max_steps` statements or runs longer than `timeout` seconds. Programs
+    compiled for a source are kept and reused the next time the same source
+    is sent.
+    """
+    socket_path = socket_path or default_socket()
+    if os.path.lexists(socket_path):
+        if not is_socket(socket_path):
+            print(f"{socket_path} exists and is not a socket.", file=sys.stderr)
+            return 1
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(socket_path)
+            except OSError:
+                # Left behind by a daemon that didn't get to clean up.
+                os.unlink(socket_path)
+            else:
+                print(f"A Lox daemon is already listening on {socket_path}.", file=sys.stderr)
+                return 1
+
+    with Server(socket_path, Handler) as server:
+        server.programs = ProgramPool(engine, optimize, max_steps, timeout)
+        print(f"Serving {engine} on {socket_path}", file=sys.stderr)
+        # Service managers stop daemons with SIGTERM; leave the same way as on ^C.
+        previous = signal.signal(signal.SIGTERM, terminate)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+            if is_socket(socket_path):
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(socket_path)
+    return 0
+
+
+def is_socket(path):
+    try:
+        return stat.S_ISSOCK(os.lstat(path).st_mode)
+    except FileNotFoundError:
+        return False
+
+
+def terminate(signum, frame):
+    raise KeyboardInterrupt
@@ -1,10 +1,40 @@
 from errors import LoxRuntimeError
 
 
+class Cell:
+    """A captured variable, shared by the scope that declared it and the closures that captured it."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+def capture(env, upvalues):
+    """The cells a function with `upvalues` captures when it is created in `env`."""
+    if not upvalues:
+        return ()
+    return tuple(env.ancestor(depth).slots[slot] if depth is not None else env.cells[slot]
+                 for depth, slot in upvalues)
+
+
 class Environment:
-    def __init__(self, parent=None):
-        self.parent: Environment = parent
-        self.values = {}
+    """
+    A local scope. Variables are stored in declaration order and addressed by
+    the (distance, slot) pairs the `Resolver` assigns, so reads and writes
+    never hash the variable name.
+
+    A function's environment has no parent; the variables it captured from
+    enclosing functions are in `cells`, which its blocks' environments
+    share.
+    """
+
+    __slots__ = ("parent", "slots", "cells")
+
+    def __init__(self, parent=None, slots=None, cells=None):
+        self.parent = parent
+        self.slots = [] if slots is None else slots
+        self.cells = cells if cells is not None or parent is None else parent.cells
 
     def ancestor(self, distance):
         e = self
@@ -13,30 +43,37 @@ class Environment:
 
         return e
 
+    def define(self, value):
+        self.slots.append(value)
+
+    def get_at(self, distance, slot):
+        return self.ancestor(distance).slots[slot]
+
+    def assign_at(self, distance, slot, value):
+        self.ancestor(distance).slots[slot] = value
+
+
+class GlobalEnvironment:
+    """The outermost scope. Globals are late bound, so they stay keyed by name."""
+
+    # Nothing at the top level is captured.
+    cells = None
+
+    def __init__(self):
+        self.values = {}
+
     def define(self, name, value):
         self.values[name.lexeme] = value
 
-    def get(self, name, fallback=True):
+    def get(self, name):
         if name.lexeme in self.values:
             return self.values[name.lexeme]
 
-        if fallback and self.parent is not None:
-            return self.parent.get(name)
-
         raise LoxRuntimeError(name, f"Undefined Variable '{name.lexeme}'.")
 
-    def get_at(self, distance, name):
-        return self.ancestor(distance).get(name, fallback=False)
-
-    def assign(self, name, value, fallback=True):
+    def assign(self, name, value):
         if name.lexeme in self.values:
             self.values[name.lexeme] = value
             return value
 
-        if fallback and self.parent is not None:
-            return self.parent.assign(name, value)
-
         raise LoxRuntimeError(name, f"Undefined Variable '{name.lexeme}'.")
-
-    def assign_at(self, distance, name, value):
-        self.ancestor(distance).assign(name, value, fallback=False)
@@ -5,10 +5,5 @@ class LoxRuntimeError(Exception):
         self.message = message
 
 
-class Return(Exception):
-    def __init__(self, value):
-        self.value = value
-
-
 class ParserError(Exception):
     pass
\ No newline at end of file
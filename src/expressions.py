@@ -1,5 +1,7 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
+from inline_cache import InlineCache
+from type_feedback import TypeFeedback
 from tokens import Token
 import typing
 
@@ -9,15 +11,49 @@ class Expr:
         raise NotImplemented
 
 
+@dataclass(frozen=True, eq=True)
+class Resolvable(Expr):
+    """
+    A node that refers to a variable. The Resolver stores where the variable
+    lives directly on the node: `depth` and `slot` for a variable of the
+    enclosing function, with `cell` set when a closure has captured it, or
+    `upvalue`, the index of the captured variable in the function's cells.
+    All of them stay None for globals.
+    """
+    depth: int = field(default=None, compare=False, repr=False, kw_only=True)
+    slot: int = field(default=None, compare=False, repr=False, kw_only=True)
+    cell: bool = field(default=False, compare=False, repr=False, kw_only=True)
+    upvalue: int = field(default=None, compare=False, repr=False, kw_only=True)
+
+    def resolve(self, depth, slot):
+        object.__setattr__(self, "depth", depth)
+        object.__setattr__(self, "slot", slot)
+
+    def resolve_upvalue(self, index):
+        object.__setattr__(self, "upvalue", index)
+
+    def mark_cell(self):
+        object.__setattr__(self, "cell", True)
+
+
 @dataclass(frozen=True, eq=True)
 class Binary(Expr):
+    """
+    `operand_type` is set by TypeInference when both operands are proven to
+    have the type the operator requires, so it needn't be checked.
+    """
     left: Expr
     operator: Token
     right: Expr
+    operand_type: str = field(default=None, compare=False, repr=False, kw_only=True)
+    feedback: TypeFeedback = field(default_factory=TypeFeedback, compare=False, repr=False, kw_only=True)
 
     def accept(self, visitor):
         return visitor.visit_binary_expr(self)
 
+    def annotate(self, operand_type):
+        object.__setattr__(self, "operand_type", operand_type)
+
 
 @dataclass(frozen=True, eq=True)
 class Grouping(Expr):
@@ -29,7 +65,9 @@ class Grouping(Expr):
 
 @dataclass(frozen=True, eq=True)
 class Literal(Expr):
+    """`token` is the one it was parsed from; folded Literals have none."""
     value: typing.Any
+    token: Token = field(default=None, compare=False, repr=False, kw_only=True)
 
     def accept(self, visitor):
         return visitor.visit_literal_expr(self)
@@ -39,13 +77,17 @@ class Literal(Expr):
 class Unary(Expr):
     operator: Token
     right: Expr
+    operand_type: str = field(default=None, compare=False, repr=False, kw_only=True)
 
     def accept(self, visitor):
         return visitor.visit_unary_expr(self)
 
+    def annotate(self, operand_type):
+        object.__setattr__(self, "operand_type", operand_type)
+
 
 @dataclass(frozen=True, eq=True)
-class Variable(Expr):
+class Variable(Resolvable):
     name: Token
 
     def accept(self, visitor):
@@ -53,7 +95,7 @@ class Variable(Expr):
 
 
 @dataclass(frozen=True, eq=True)
-class Assign(Expr):
+class Assign(Resolvable):
     name: Token
     value: Expr
 
@@ -72,15 +114,44 @@ class Call(Expr):
     callee: Expr
     paren: Token
     arguments: [Expr]
+    feedback: TypeFeedback = field(default_factory=TypeFeedback, compare=False, repr=False, kw_only=True)
 
     def accept(self, visitor):
         return visitor.visit_call_expr(self)
 
 
+# Specialized variants the tree-walker rewrites hot Binary and Call nodes
+# into, by changing their class in place, and back again when a guard fails.
+
+@dataclass(frozen=True, eq=True)
+class NumberBinary(Binary):
+    def accept(self, visitor):
+        return visitor.visit_number_binary_expr(self)
+
+
+@dataclass(frozen=True, eq=True)
+class StringConcat(Binary):
+    def accept(self, visitor):
+        return visitor.visit_string_concat_expr(self)
+
+
+@dataclass(frozen=True, eq=True)
+class FunctionCall(Call):
+    def accept(self, visitor):
+        return visitor.visit_function_call_expr(self)
+
+
+@dataclass(frozen=True, eq=True)
+class NativeCall(Call):
+    def accept(self, visitor):
+        return visitor.visit_native_call_expr(self)
+
+
 @dataclass(frozen=True, eq=True)
 class Get(Expr):
     object: Expr
     name: Token
+    cache: InlineCache = field(default_factory=InlineCache, compare=False, repr=False, kw_only=True)
 
     def accept(self, visitor):
         return visitor.visit_get_expr(self)
@@ -91,13 +162,14 @@ class Set(Expr):
     object: Expr
     name: Token
     value: Expr
+    cache: InlineCache = field(default_factory=InlineCache, compare=False, repr=False, kw_only=True)
 
     def accept(self, visitor):
         return visitor.visit_set_expr(self)
 
 
 @dataclass(frozen=True, eq=True)
-class This(Expr):
+class This(Resolvable):
     keyword: Token
 
     def accept(self, visitor):
@@ -105,9 +177,14 @@ class This(Expr):
 
 
 @dataclass(frozen=True, eq=True)
-class Super(Expr):
+class Super(Resolvable):
+    """`this` is the receiver the method is looked up for, resolved by the Resolver."""
     keyword: Token
     method: Token
+    this: This = field(default=None, compare=False, repr=False, kw_only=True)
 
     def accept(self, visitor):
         return visitor.visit_super_expr(self)
+
+    def resolve_this(self, this: This):
+        object.__setattr__(self, "this", this)
@@ -0,0 +1,114 @@
+import dataclasses
+import sys
+
+from errors import LoxRuntimeError
+
+POLYMORPHIC_LIMIT = 4
+
+
+class InlineCache:
+    """
+    Remembers property lookups made at one Get, Set or invoke site, keyed by
+    the receiver's shape. Every class has its own root shape, so a shape
+    also pins down the class and its methods, and a hit needs no further
+    checks.
+
+    The most recently seen shape is kept in `shape` so the common
+    monomorphic case is a single identity comparison. Up to
+    POLYMORPHIC_LIMIT shapes are remembered in `entries`; past that the site
+    is megamorphic and new shapes are looked up without being cached.
+
+    For reads an entry is (offset, method): the field's offset, or None and
+    the method to bind. For writes it is (offset, shape): the field's offset,
+    or None and the shape the instance moves to when the field is added.
+    """
+
+    __slots__ = ("shape", "offset", "target", "entries", "megamorphic", "hits", "misses")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.shape = None
+        self.offset = None
+        self.target = None
+        self.entries = {}
+        self.megamorphic = False
+        self.hits = 0
+        self.misses = 0
+
+    def state(self):
+        if self.megamorphic:
+            return "megamorphic"
+        if len(self.entries) > 1:
+            return "polymorphic"
+        if self.entries:
+            return "monomorphic"
+        return "uninitialized"
+
+    def get_miss(self, instance, name):
+        shape = instance.shape
+        entry = self.entries.get(shape)
+        if entry is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            offset = shape.offsets.get(name.lexeme)
+            method = None
+            if offset is None:
+                method = instance.klass.method_table.get(name.lexeme)
+                if method is None:
+                    raise LoxRuntimeError(name, f"Undefined property {name.lexeme}.")
+            entry = (offset, method)
+            self.remember(shape, entry)
+        return entry
+
+    def set_miss(self, instance, name):
+        shape = instance.shape
+        entry = self.entries.get(shape)
+        if entry is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            offset = shape.offsets.get(name.lexeme)
+            if offset is None:
+                entry = (None, shape.with_field(name.lexeme))
+            else:
+                entry = (offset, None)
+            self.remember(shape, entry)
+        return entry
+
+    def remember(self, shape, entry):
+        if len(self.entries) < POLYMORPHIC_LIMIT:
+            self.entries[shape] = entry
+        else:
+            self.megamorphic = True
+        self.shape = shape
+        self.offset, self.target = entry
+
+
+def cached_sites(node, kind=InlineCache):
+    """Yields every (node, cache) pair, for caches of type `kind`, in the syntax tree(s) rooted at `node`."""
+    if isinstance(node, (list, tuple)):
+        for child in node:
+            yield from cached_sites(child, kind)
+        return
+    if not dataclasses.is_dataclass(node):
+        return
+
+    values = [getattr(node, field.name) for field in dataclasses.fields(node)]
+    for value in values:
+        if isinstance(value, kind):
+            yield node, value
+    for value in values:
+        if not isinstance(value, kind):
+            yield from cached_sites(value, kind)
+
+
+def print_cache_stats(statements, file=sys.stderr):
+    for node, cache in cached_sites(statements):
+        if cache.hits == 0 and cache.misses == 0:
+            continue
+        kind = type(node).__name__.lower()
+        print(f"[line {node.name.line}] {kind} .{node.name.lexeme}: "
+              f"{cache.hits} hits, {cache.misses} misses ({cache.state()})", file=file)
@@ -1,12 +1,26 @@
+import operator
+
 import tokens
-from environment import Environment
-from errors import LoxRuntimeError, Return
+from environment import Cell, Environment, GlobalEnvironment, capture
+from errors import LoxRuntimeError
 
 import statements as Stmt
 import expressions as Expr
-from lox_function import LoxFunction
+from lox_function import BoundMethod, LoxFunction, Return, TailCall
 from lox_class import LoxClass, LoxInstance
 
+# Used where TypeInference has proven the operand types, so nothing is checked.
+UNCHECKED_OPERATORS = {
+    tokens.PLUS: operator.add,
+    tokens.MINUS: operator.sub,
+    tokens.STAR: operator.mul,
+    tokens.SLASH: operator.truediv,
+    tokens.GREATER: operator.gt,
+    tokens.GREATER_EQUAL: operator.ge,
+    tokens.LESS: operator.lt,
+    tokens.LESS_EQUAL: operator.le,
+}
+
 
 class CLOCK:
 
@@ -34,7 +48,7 @@ class PRINT:
         value = arguments[0]
         if hasattr(value, "to_string") and callable(value.to_string):
             value = value.to_string()
-        print(value)
+        print(value, file=interpreter.output)
         return None
 
     def to_string(self):
@@ -42,86 +56,139 @@ class PRINT:
 
 
 class Interpreter:
-    def __init__(self, report):
+    # What functions and methods declared by the program are created as.
+    function_class = LoxFunction
+    # Where `print` writes to; None for stdout.
+    output = None
+
+    def __init__(self, report, meter=None):
         self.report = report
-        self.global_env = Environment()
+        self.global_env = GlobalEnvironment()
         self.environment = self.global_env
-        self.locals = {}
+        # Only a metered interpreter pays for counting statements.
+        self.meter = meter
+        if meter is not None:
+            self.execute = self.metered_execute
 
         self.global_env.define(tokens.Token(tokens.IDENTIFIER, "clock", "clock", -1), CLOCK)
         self.global_env.define(tokens.Token(tokens.IDENTIFIER, "print", "print", -1), PRINT)
 
     def interpret(self, stmts: [Stmt.Stmt]):
-        try:
-            for stmt in stmts:
-                self.execute(stmt)
-        except LoxRuntimeError as ir:
-            self.report(ir)
+        self.prepare(stmts)()
+
+    def prepare(self, stmts: [Stmt.Stmt]):
+        """
+        Returns a function that runs `stmts` against this engine's globals
+        each time it is called, reporting any runtime error.
+        """
+        def run():
+            try:
+                for stmt in stmts:
+                    self.execute(stmt)
+            except LoxRuntimeError as ir:
+                self.report(ir)
+        return run
 
     def execute(self, stmt: Stmt.Stmt):
         return stmt.accept(self)
 
+    def metered_execute(self, stmt: Stmt.Stmt):
+        meter = self.meter
+        meter.steps += 1
+        if meter.steps >= meter.limit:
+            meter.check(stmt)
+        return stmt.accept(self)
+
     def evaluate(self, expr: Expr.Expr):
         value = expr.accept(self)
         return value
 
-    def lookup_variable(self, name: tokens.Token, expression: Expr):
-        distance = self.locals.get(expression)
-        value = None
-        if distance is not None:
-            value = self.environment.get_at(distance, name)
+    def lookup_variable(self, name: tokens.Token, expression: Expr.Resolvable):
+        distance = expression.depth
+        if distance is None:
+            if expression.upvalue is not None:
+                return self.environment.cells[expression.upvalue].value
+            return self.global_env.get(name)
+        if distance == 0:
+            value = self.environment.slots[expression.slot]
         else:
-            value = self.global_env.get(name)
+            value = self.environment.ancestor(distance).slots[expression.slot]
+        if expression.cell:
+            return value.value
         return value
 
+    def define(self, name: tokens.Token, value):
+        if self.environment is self.global_env:
+            self.global_env.define(name, value)
+        else:
+            self.environment.define(value)
+
     def visit_block_stmt(self, stmt: Stmt.Block):
-        return self.execute_block(
-            stmt.statements,
-            Environment(self.environment))
+        if stmt.environment == Stmt.NEW_ENVIRONMENT:
+            return self.execute_block(stmt.statements, Environment(self.environment))
+        if stmt.environment == Stmt.NO_ENVIRONMENT:
+            return self.execute_statements(stmt.statements)
+
+        slots = self.environment.slots
+        size = len(slots)
+        try:
+            return self.execute_statements(stmt.statements)
+        finally:
+            del slots[size:]
+
+    def execute_statements(self, stmts: [Stmt]):
+        for stmt in stmts:
+            completion = self.execute(stmt)
+            if completion is not None:
+                return completion
+        return None
 
     def execute_block(self, stmts: [Stmt], env: Environment):
         prev_environment = self.environment
         try:
             self.environment = env
-            for stmt in stmts:
-                self.execute(stmt)
+            return self.execute_statements(stmts)
         finally:
             self.environment = prev_environment
-        return None
 
     def visit_class_stmt(self, stmt: Stmt.Class):
+        # A captured class is defined before its methods are created, as
+        # they may capture it.
+        cell = None
+        if stmt.captured:
+            cell = Cell(None)
+            self.define(stmt.name, cell)
+
         superclass = None
         if stmt.superclass is not None:
             superclass = self.evaluate(stmt.superclass)
             if not isinstance(superclass, LoxClass):
                 raise LoxRuntimeError(stmt.superclass.name, "Superclass must be a class.")
 
-        self.environment.define(stmt.name, None)
-
         if stmt.superclass is not None:
-            self.environment = Environment(self.environment)
-            self.environment.define(tokens.Token(tokens.SUPER, 'super', 'super', -1), superclass)
+            self.environment = Environment(self.environment, [Cell(superclass)])
 
         methods = {}
         for method in stmt.methods:
-            function = LoxFunction(method, self.environment, is_initializer=method.name.lexeme == "init")
+            function = self.function_class(method, capture(self.environment, method.upvalues),
+                                           is_initializer=method.name.lexeme == "init")
             methods[method.name.lexeme] = function
         klass = LoxClass(stmt.name, superclass, methods)
 
         if superclass is not None:
             self.environment = self.environment.parent
-        self.environment.assign(stmt.name, klass)
+        if cell is not None:
+            cell.value = klass
+        else:
+            self.define(stmt.name, klass)
         return None
 
-    def resolve(self, expr: Expr, depth: int):
-        self.locals[expr] = depth
-
     def visit_print_stmt(self, stmt: Stmt.Print):
         value = self.evaluate(stmt.expression)
         if hasattr(value, "to_string") and callable(value.to_string):
             value = value.to_string()
 
-        print(value)
+        print(value, file=self.output)
         return None
 
     def visit_expression_stmt(self, stmt: Stmt.Expression):
@@ -130,38 +197,102 @@ class Interpreter:
 
     def visit_if_stmt(self, stmt: Stmt.If):
         if self.is_truthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.then_branch)
+            return self.execute(stmt.then_branch)
         elif stmt.else_branch is not None:
-            self.execute(stmt.else_branch)
+            return self.execute(stmt.else_branch)
         return None
 
     def visit_var_stmt(self, stmt: Stmt.Var):
         value = None
         if stmt.initializer is not None:
             value = self.evaluate(stmt.initializer)
-        self.environment.define(stmt.name, value)
+        self.define(stmt.name, Cell(value) if stmt.captured else value)
 
     def visit_while_stmt(self, stmt: Stmt.While):
         while self.is_truthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.body)
+            completion = self.execute(stmt.body)
+            if completion is not None:
+                return completion
         return None
 
     def visit_function_stmt(self, stmt: Stmt.Function):
-        function = LoxFunction(stmt, self.environment)
-        self.environment.define(stmt.name, function)
+        if stmt.captured:
+            # Defined first, so the function can capture itself.
+            cell = Cell(None)
+            self.define(stmt.name, cell)
+            cell.value = self.function_class(stmt, capture(self.environment, stmt.upvalues))
+            return None
+        function = self.function_class(stmt, capture(self.environment, stmt.upvalues))
+        self.define(stmt.name, function)
         return None
 
     def visit_return_stmt(self, stmt: Stmt.Return):
         value = None
-        if stmt.value is not None:
+        if stmt.tail_call:
+            value = self.visit_call_expr(stmt.value, tail=True)
+        elif stmt.value is not None:
             value = self.evaluate(stmt.value)
 
-        raise Return(value)
+        return Return(value)
 
     def visit_binary_expr(self, expr: Expr.Binary):
         left = self.evaluate(expr.left)
         right = self.evaluate(expr.right)
 
+        if expr.operand_type is not None:
+            return UNCHECKED_OPERATORS[expr.operator.token_type](left, right)
+        if expr.operator.token_type in UNCHECKED_OPERATORS and not expr.feedback.is_generic():
+            self.observe_binary(expr, left, right)
+        return self.binary_operation(expr, left, right)
+
+    def observe_binary(self, expr: Expr.Binary, left, right):
+        token_type = expr.operator.token_type
+        kind = None
+        if type(left) is float and type(right) is float:
+            kind = "number"
+        elif token_type == tokens.PLUS and type(left) is str and type(right) is str:
+            kind = "string"
+        if expr.feedback.observe(kind):
+            specialized = Expr.NumberBinary if kind == "number" else Expr.StringConcat
+            self.specialize(expr, specialized, kind, UNCHECKED_OPERATORS[token_type])
+
+    def visit_number_binary_expr(self, expr: Expr.NumberBinary):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is float and type(right) is float:
+            return expr.feedback.target(left, right)
+        self.despecialize(expr, Expr.Binary)
+        return self.binary_operation(expr, left, right)
+
+    def visit_string_concat_expr(self, expr: Expr.StringConcat):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is str and type(right) is str:
+            return left + right
+        self.despecialize(expr, Expr.Binary)
+        return self.binary_operation(expr, left, right)
+
+    def specialize(self, expr, specialized, kind, target):
+        """
+        Rewrites `expr` in place into its `specialized` variant, whose visit
+        method skips the generic checks behind a guard on `target` or the
+        operand types.
+        """
+        feedback = expr.feedback
+        feedback.specialized = kind
+        feedback.target = target
+        feedback.specializations += 1
+        object.__setattr__(expr, "__class__", specialized)
+
+    def despecialize(self, expr, generic):
+        feedback = expr.feedback
+        feedback.specialized = None
+        feedback.kind = None
+        feedback.count = 0
+        feedback.despecializations += 1
+        object.__setattr__(expr, "__class__", generic)
+
+    def binary_operation(self, expr: Expr.Binary, left, right):
         if expr.operator.token_type == tokens.MINUS:
             self.check_numeric_operands(expr.operator, left, right)
             return left - right
@@ -206,6 +337,8 @@ class Interpreter:
 
     def visit_unary_expr(self, expr: Expr.Unary):
         right = self.evaluate(expr.right)
+        if expr.operand_type is not None:
+            return -right
         if expr.operator.token_type == tokens.MINUS:
             self.check_numeric_operands(expr.operator, right)
             return -right
@@ -216,11 +349,15 @@ class Interpreter:
 
     def visit_assign_expr(self, expr: Expr.Assign):
         value = self.evaluate(expr.value)
-        distance = self.locals.get(expr)
-        if distance is not None:
-            self.environment.assign_at(distance, expr, value)
+        if expr.depth is None:
+            if expr.upvalue is not None:
+                self.environment.cells[expr.upvalue].value = value
+            else:
+                self.global_env.assign(expr.name, value)
+        elif expr.cell:
+            self.environment.get_at(expr.depth, expr.slot).value = value
         else:
-            self.global_env.assign(expr, value)
+            self.environment.assign_at(expr.depth, expr.slot, value)
         return value
 
     def visit_variable_expr(self, expr: Expr.Variable):
@@ -239,8 +376,47 @@ class Interpreter:
 
         return self.evaluate(expr.right)
 
-    def visit_call_expr(self, expr: Expr.Call):
+    def visit_call_expr(self, expr: Expr.Call, tail=False):
+        """
+        With `tail` set, calls to Lox functions are not made but returned as
+        a `TailCall` for the enclosing function's loop to run.
+        """
+        if type(expr.callee) is Expr.Get:
+            return self.invoke(expr, expr.callee, tail)
+        if type(expr.callee) is Expr.Super:
+            return self.invoke_super(expr, expr.callee, tail)
+
         callee = self.evaluate(expr.callee)
+        if not tail and not expr.feedback.is_generic():
+            self.observe_call(expr, callee)
+        return self.call(expr, callee, tail)
+
+    def observe_call(self, expr: Expr.Call, callee):
+        # Only callees whose arity matches are worth specializing on, as the
+        # specialized calls don't check it again.
+        if type(callee) is LoxFunction:
+            if expr.feedback.observe("function", callee.declaration) and callee.arity() == len(expr.arguments):
+                self.specialize(expr, Expr.FunctionCall, "function", callee.declaration)
+        elif type(callee) in (BoundMethod, LoxClass) or not hasattr(callee, "call"):
+            expr.feedback.observe(None)
+        elif expr.feedback.observe("native", callee) and callee.arity() == len(expr.arguments):
+            self.specialize(expr, Expr.NativeCall, "native", callee)
+
+    def visit_function_call_expr(self, expr: Expr.FunctionCall):
+        callee = self.evaluate(expr.callee)
+        if type(callee) is not LoxFunction or callee.declaration is not expr.feedback.target:
+            self.despecialize(expr, Expr.Call)
+            return self.call(expr, callee)
+        return callee.call(self, [self.evaluate(arg) for arg in expr.arguments])
+
+    def visit_native_call_expr(self, expr: Expr.NativeCall):
+        callee = self.evaluate(expr.callee)
+        if callee is not expr.feedback.target:
+            self.despecialize(expr, Expr.Call)
+            return self.call(expr, callee)
+        return callee.call(self, [self.evaluate(arg) for arg in expr.arguments])
+
+    def call(self, expr: Expr.Call, callee, tail=False):
         arguments = []
         for arg in expr.arguments:
             arguments.append(self.evaluate(arg))
@@ -251,29 +427,95 @@ class Interpreter:
         if len(arguments) != callee.arity():
             raise LoxRuntimeError(expr.paren, "Wrong number of arguments.")
 
+        if tail and isinstance(callee, (LoxFunction, BoundMethod)):
+            return callee.tail_call(arguments)
         return callee.call(self, arguments)
 
+    def invoke(self, expr: Expr.Call, get: Expr.Get, tail=False):
+        """
+        Calls `obj.method(...)` without creating a bound method. Fields shadow
+        methods, so those fall back to an ordinary call of the field's value.
+        """
+        obj = self.evaluate(get.object)
+        if not isinstance(obj, LoxInstance):
+            raise LoxRuntimeError(get.name, "Only instances have properties")
+
+        cache = get.cache
+        if cache.shape is obj.shape:
+            cache.hits += 1
+            offset, method = cache.offset, cache.target
+        else:
+            offset, method = cache.get_miss(obj, get.name)
+
+        if offset is not None:
+            return self.call(expr, obj.values[offset], tail)
+
+        arguments = [obj]
+        for arg in expr.arguments:
+            arguments.append(self.evaluate(arg))
+        if len(arguments) - 1 != method.arity():
+            raise LoxRuntimeError(expr.paren, "Wrong number of arguments.")
+        if tail:
+            return TailCall(method, obj, arguments)
+        return method.run(self, arguments, obj)
+
+    def invoke_super(self, expr: Expr.Call, sup: Expr.Super, tail=False):
+        superclass = self.lookup_variable(sup.keyword, sup)
+        obj = self.evaluate(sup.this)
+        method = superclass.find_method(sup.method.lexeme)
+        if method is None:
+            raise LoxRuntimeError(sup.method, f"Undefined property {sup.method.lexeme}.")
+
+        arguments = [obj]
+        for arg in expr.arguments:
+            arguments.append(self.evaluate(arg))
+        if len(arguments) - 1 != method.arity():
+            raise LoxRuntimeError(expr.paren, "Wrong number of arguments.")
+        if tail:
+            return TailCall(method, obj, arguments)
+        return method.run(self, arguments, obj)
+
     def visit_get_expr(self, expr: Expr.Get):
         obj = self.evaluate(expr.object)
-        if isinstance(obj, LoxInstance):
-            return obj.get(expr.name)
+        if not isinstance(obj, LoxInstance):
+            raise LoxRuntimeError(expr.name, "Only instances have properties")
 
-        raise LoxRuntimeError(expr.name, "Only instances have properties")
+        cache = expr.cache
+        if cache.shape is obj.shape:
+            cache.hits += 1
+            offset, method = cache.offset, cache.target
+        else:
+            offset, method = cache.get_miss(obj, expr.name)
+
+        if offset is not None:
+            return obj.values[offset]
+        return method.bind(obj)
 
     def visit_set_expr(self, expr: Expr.Set):
         obj = self.evaluate(expr.object)
         if not isinstance(obj, LoxInstance):
             raise LoxRuntimeError(expr.name, "Only instances have properties")
         value = self.evaluate(expr.value)
-        obj.set(expr.name, value)
+
+        cache = expr.cache
+        if cache.shape is obj.shape:
+            cache.hits += 1
+            offset, shape = cache.offset, cache.target
+        else:
+            offset, shape = cache.set_miss(obj, expr.name)
+
+        if offset is not None:
+            obj.values[offset] = value
+        else:
+            obj.shape = shape
+            obj.values.append(value)
 
     def visit_this_expr(self, expr: Expr.This):
         return self.lookup_variable(expr.keyword, expr)
 
     def visit_super_expr(self, expr: Expr.Super):
-        distance = self.locals.get(expr)
-        superclass = self.environment.get_at(distance, expr.keyword)
-        obj = self.environment.get_at(distance - 1, tokens.Token(tokens.THIS, 'this', 'this', -1))
+        superclass = self.lookup_variable(expr.keyword, expr)
+        obj = self.evaluate(expr.this)
         method = superclass.find_method(expr.method.lexeme)
 
         if method is None:
@@ -0,0 +1,473 @@
+import math
+
+import expressions as Expr
+import statements as Stmt
+import tokens
+from errors import LoxRuntimeError
+from interpreter import Interpreter
+from lox_class import LoxInstance
+from lox_function import BoundMethod, LoxFunction
+
+# Calls to a function, counted per declaration, after which its body is
+# translated to Python.
+JIT_THRESHOLD = 100
+
+NUMERIC_OPERATORS = {
+    tokens.MINUS: "-",
+    tokens.STAR: "*",
+    tokens.SLASH: "/",
+    tokens.GREATER: ">",
+    tokens.GREATER_EQUAL: ">=",
+    tokens.LESS: "<",
+    tokens.LESS_EQUAL: "<=",
+}
+
+
+class Unsupported(Exception):
+    """Raised while translating a function the JIT leaves to the tree-walker."""
+
+
+# Helpers the generated code calls for anything that isn't a Python
+# operator. They mirror the tree-walker's checks and raise the same errors
+# on the same tokens.
+
+def fail(token, message):
+    raise LoxRuntimeError(token, message)
+
+
+def undefined(token):
+    raise LoxRuntimeError(token, f"Undefined Variable '{token.lexeme}'.")
+
+
+def assign_global(values, token, value):
+    if token.lexeme not in values:
+        undefined(token)
+    values[token.lexeme] = value
+    return value
+
+
+def store(cell, value):
+    cell.value = value
+    return value
+
+
+def check_callable(callee, arguments, paren):
+    if not hasattr(callee, "call") or not callable(callee.call):
+        raise LoxRuntimeError(paren, "Can only call functions and classes.")
+    if len(arguments) != callee.arity():
+        raise LoxRuntimeError(paren, "Wrong number of arguments.")
+
+
+def call(interpreter, callee, arguments, paren):
+    if not isinstance(callee, LoxFunction) or len(arguments) != len(callee.declaration.params):
+        check_callable(callee, arguments, paren)
+    return callee.call(interpreter, arguments)
+
+
+def tail_call(interpreter, callee, arguments, paren):
+    check_callable(callee, arguments, paren)
+    if isinstance(callee, (LoxFunction, BoundMethod)):
+        return callee.tail_call(arguments)
+    return callee.call(interpreter, arguments)
+
+
+def instance(obj, name):
+    if not isinstance(obj, LoxInstance):
+        raise LoxRuntimeError(name, "Only instances have properties")
+    return obj
+
+
+def lookup(obj, get: Expr.Get):
+    """Returns (obj, offset, method) for `obj.name`, through the Get node's inline cache."""
+    instance(obj, get.name)
+    cache = get.cache
+    if cache.shape is obj.shape:
+        cache.hits += 1
+        return obj, cache.offset, cache.target
+    offset, method = cache.get_miss(obj, get.name)
+    return obj, offset, method
+
+
+def get_property(obj, expr: Expr.Get):
+    obj, offset, method = lookup(obj, expr)
+    if offset is not None:
+        return obj.values[offset]
+    return method.bind(obj)
+
+
+def set_property(obj, value, expr: Expr.Set):
+    cache = expr.cache
+    if cache.shape is obj.shape:
+        cache.hits += 1
+        offset, shape = cache.offset, cache.target
+    else:
+        offset, shape = cache.set_miss(obj, expr.name)
+
+    if offset is not None:
+        obj.values[offset] = value
+    else:
+        obj.shape = shape
+        obj.values.append(value)
+    return value
+
+
+def invoke(interpreter, target, arguments, paren):
+    obj, offset, method = target
+    if offset is not None:
+        return call(interpreter, obj.values[offset], arguments, paren)
+    if len(arguments) != method.arity():
+        raise LoxRuntimeError(paren, "Wrong number of arguments.")
+    return method.invoke(interpreter, obj, arguments)
+
+
+def tail_invoke(interpreter, target, arguments, paren):
+    obj, offset, method = target
+    if offset is not None:
+        return tail_call(interpreter, obj.values[offset], arguments, paren)
+    if len(arguments) != method.arity():
+        raise LoxRuntimeError(paren, "Wrong number of arguments.")
+    return method.tail_invoke(obj, arguments)
+
+
+HELPERS = {
+    helper.__name__: helper
+    for helper in (fail, undefined, assign_global, store, call, tail_call, instance, lookup, get_property,
+                   set_property, invoke, tail_invoke)
+}
+
+
+class FunctionTranslator:
+    """
+    Translates one resolved function declaration into the source of a Python
+    function taking (interpreter, env), where `env` is the call's
+    environment as `LoxFunction.run` builds it. The result is what
+    `LoxFunction.execute` returns: the function's value or a `TailCall`.
+
+    Parameters and every variable declared in the body become Python
+    locals, each under its own name so shadowing in nested blocks is kept.
+    That's only sound while nothing can capture them, so declaring a
+    function or class in the body is unsupported, as is `super`. Variables
+    the function captured are read through its cells, and globals from the
+    global dict.
+
+    Arithmetic is emitted as Python operators. Unless TypeInference has
+    proven the operands, both are stored in temporaries and type checked
+    first, failing with the tree-walker's error on the operator's token.
+    Tokens and nodes the generated code needs are passed in as constants.
+
+    With a meter, each statement first counts a step on it, `M`, as
+    `Interpreter.metered_execute` does.
+    """
+
+    def __init__(self, declaration: Stmt.Function, is_method, global_values, meter=None):
+        self.declaration = declaration
+        self.is_method = is_method
+        self.meter = meter
+        self.lines = []
+        self.indent = 1
+        self.scopes = []
+        self.names = 0
+        self.temps = 0
+        self.constants = 0
+        self.namespace = dict(HELPERS)
+        self.namespace["G"] = global_values
+        self.namespace["M"] = meter
+
+    def translate(self):
+        """Returns the Python source and the namespace to exec it in."""
+        if not self.declaration.has_environment:
+            # Called without an environment; the body declares nothing.
+            for stmt in self.declaration.body:
+                self.execute(stmt)
+            self.emit("return None")
+        else:
+            self.scopes.append([])
+            parameters = list(self.declaration.params)
+            if self.is_method:
+                parameters.insert(0, tokens.Token(tokens.THIS, "this", None, self.declaration.name.line))
+            if self.declaration.upvalues:
+                self.emit("cells = env.cells")
+            if parameters:
+                self.emit("slots = env.slots")
+            for slot, parameter in enumerate(parameters):
+                self.emit(f"{self.declare(parameter)} = slots[{slot}]")
+            for stmt in self.declaration.body:
+                self.execute(stmt)
+            self.emit("return None")
+            self.scopes.pop(-1)
+
+        header = f"def {self.function_name()}(interpreter, env):"
+        return "\n".join([header] + self.lines) + "\n", self.namespace
+
+    def function_name(self):
+        return f"lox_{self.declaration.name.lexeme}"
+
+    def emit(self, line):
+        self.lines.append("    " * self.indent + line)
+
+    def constant(self, value):
+        name = f"K{self.constants}"
+        self.constants += 1
+        self.namespace[name] = value
+        return name
+
+    def declare(self, name: tokens.Token):
+        self.names += 1
+        local = f"v{self.names}_{name.lexeme}"
+        self.scopes[-1].append(local)
+        return local
+
+    def temp(self):
+        self.temps += 1
+        return f"t{self.temps}"
+
+    def execute(self, stmt: Stmt.Stmt):
+        if self.meter is not None:
+            self.emit("M.steps += 1")
+            self.emit(f"if M.steps >= M.limit: M.check({self.constant(stmt)})")
+        stmt.accept(self)
+
+    def evaluate(self, expr: Expr.Expr):
+        return expr.accept(self)
+
+    def suite(self, stmt: Stmt.Stmt):
+        self.indent += 1
+        length = len(self.lines)
+        self.execute(stmt)
+        if len(self.lines) == length:
+            self.emit("pass")
+        self.indent -= 1
+
+    def truthy(self, expr: Expr.Expr):
+        value = self.temp()
+        return f"({value} := {self.evaluate(expr)}) is not None and {value} is not False"
+
+    def visit_block_stmt(self, stmt: Stmt.Block):
+        if stmt.environment == Stmt.NEW_ENVIRONMENT:
+            self.scopes.append([])
+            for statement in stmt.statements:
+                self.execute(statement)
+            self.scopes.pop(-1)
+            return
+
+        scope = self.scopes[-1] if self.scopes else []
+        size = len(scope)
+        for statement in stmt.statements:
+            self.execute(statement)
+        del scope[size:]
+
+    def visit_class_stmt(self, stmt: Stmt.Class):
+        raise Unsupported("class declaration")
+
+    def visit_function_stmt(self, stmt: Stmt.Function):
+        raise Unsupported("function declaration")
+
+    def visit_print_stmt(self, stmt: Stmt.Print):
+        raise Unsupported("print statement")
+
+    def visit_expression_stmt(self, stmt: Stmt.Expression):
+        self.emit(self.evaluate(stmt.expression))
+
+    def visit_if_stmt(self, stmt: Stmt.If):
+        self.emit(f"if {self.truthy(stmt.condition)}:")
+        self.suite(stmt.then_branch)
+        if stmt.else_branch is not None:
+            self.emit("else:")
+            self.suite(stmt.else_branch)
+
+    def visit_var_stmt(self, stmt: Stmt.Var):
+        value = "None"
+        if stmt.initializer is not None:
+            value = self.evaluate(stmt.initializer)
+        self.emit(f"{self.declare(stmt.name)} = {value}")
+
+    def visit_while_stmt(self, stmt: Stmt.While):
+        self.emit(f"while {self.truthy(stmt.condition)}:")
+        self.suite(stmt.body)
+
+    def visit_return_stmt(self, stmt: Stmt.Return):
+        value = "None"
+        if stmt.tail_call:
+            value = self.visit_call_expr(stmt.value, tail=True)
+        elif stmt.value is not None:
+            value = self.evaluate(stmt.value)
+        self.emit(f"return {value}")
+
+    def visit_binary_expr(self, expr: Expr.Binary):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        token_type = expr.operator.token_type
+
+        if token_type == tokens.EQUAL_EQUAL:
+            return f"({left} == {right})"
+        if token_type == tokens.BANG_EQUAL:
+            return f"(not {left} == {right})"
+
+        operator = "+" if token_type == tokens.PLUS else NUMERIC_OPERATORS[token_type]
+        if expr.operand_type is not None:
+            return f"({left} {operator} {right})"
+
+        a, b = self.temp(), self.temp()
+        if token_type == tokens.PLUS:
+            guard = (f"(type({a}) is float and type({b}) is float "
+                     f"or type({a}) is str and type({b}) is str)")
+            message = "Operands must both be either strings or numbers"
+        else:
+            guard = f"type({a}) is float and type({b}) is float"
+            message = "Operand must be a number."
+        # The tuple is always truthy; it only evaluates both operands, in
+        # order, before either is checked.
+        return (f"({a} {operator} {b} if (({a} := {left}), ({b} := {right})) and {guard} "
+                f"else fail({self.constant(expr.operator)}, {message!r}))")
+
+    visit_number_binary_expr = visit_binary_expr
+    visit_string_concat_expr = visit_binary_expr
+
+    def visit_grouping_expr(self, expr: Expr.Grouping):
+        return self.evaluate(expr.expression)
+
+    def visit_literal_expr(self, expr: Expr.Literal):
+        if type(expr.value) is float and not math.isfinite(expr.value):
+            # Folded constants can overflow, and repr(inf) isn't Python.
+            return self.constant(expr.value)
+        return repr(expr.value)
+
+    def visit_unary_expr(self, expr: Expr.Unary):
+        right = self.evaluate(expr.right)
+        value = self.temp()
+        if expr.operator.token_type == tokens.BANG:
+            return f"(({value} := {right}) is None or {value} is False)"
+        if expr.operand_type is not None:
+            return f"(-{right})"
+        return (f"(-{value} if type({value} := {right}) is float "
+                f"else fail({self.constant(expr.operator)}, 'Operand must be a number.'))")
+
+    def visit_assign_expr(self, expr: Expr.Assign):
+        value = self.evaluate(expr.value)
+        if expr.upvalue is not None:
+            return f"store(cells[{expr.upvalue}], {value})"
+        if expr.depth is None:
+            return f"assign_global(G, {self.constant(expr.name)}, {value})"
+        return f"({self.local(expr)} := {value})"
+
+    def visit_variable_expr(self, expr: Expr.Variable):
+        return self.variable(expr, expr.name)
+
+    def variable(self, expr: Expr.Resolvable, name: tokens.Token):
+        if expr.upvalue is not None:
+            return f"cells[{expr.upvalue}].value"
+        if expr.depth is None:
+            return f"(G[{name.lexeme!r}] if {name.lexeme!r} in G else undefined({self.constant(name)}))"
+        return self.local(expr)
+
+    def local(self, expr: Expr.Resolvable):
+        if expr.cell:
+            # Captured by a closure declared in the body.
+            raise Unsupported("captured variable")
+        return self.scopes[-1 - expr.depth][expr.slot]
+
+    def visit_logical_expr(self, expr: Expr.Logical):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        value = self.temp()
+        truthy = f"({value} := {left}) is not None and {value} is not False"
+        if expr.operator.token_type == tokens.OR:
+            return f"({value} if {truthy} else {right})"
+        return f"({right} if {truthy} else {value})"
+
+    def visit_call_expr(self, expr: Expr.Call, tail=False):
+        arguments = "[" + ", ".join(self.evaluate(argument) for argument in expr.arguments) + "]"
+        paren = self.constant(expr.paren)
+        if type(expr.callee) is Expr.Super:
+            raise Unsupported("super call")
+        if type(expr.callee) is Expr.Get:
+            target = f"lookup({self.evaluate(expr.callee.object)}, {self.constant(expr.callee)})"
+            helper = "tail_invoke" if tail else "invoke"
+            return f"{helper}(interpreter, {target}, {arguments}, {paren})"
+
+        helper = "tail_call" if tail else "call"
+        return f"{helper}(interpreter, {self.evaluate(expr.callee)}, {arguments}, {paren})"
+
+    visit_function_call_expr = visit_call_expr
+    visit_native_call_expr = visit_call_expr
+
+    def visit_get_expr(self, expr: Expr.Get):
+        return f"get_property({self.evaluate(expr.object)}, {self.constant(expr)})"
+
+    def visit_set_expr(self, expr: Expr.Set):
+        obj = f"instance({self.evaluate(expr.object)}, {self.constant(expr.name)})"
+        return f"set_property({obj}, {self.evaluate(expr.value)}, {self.constant(expr)})"
+
+    def visit_super_expr(self, expr: Expr.Super):
+        raise Unsupported("super")
+
+    def visit_this_expr(self, expr: Expr.This):
+        return self.variable(expr, expr.keyword)
+
+
+def compile_function(declaration: Stmt.Function, is_method, global_values, meter=None):
+    """
+    Returns `declaration`'s body compiled to a Python function, or raises
+    Unsupported.
+    """
+    translator = FunctionTranslator(declaration, is_method, global_values, meter)
+    source, namespace = translator.translate()
+    code = compile(source, f"<lox fn {declaration.name.lexeme}>", "exec")
+    exec(code, namespace)
+    return namespace[translator.function_name()]
+
+
+class JitFunction(LoxFunction):
+    """A `LoxFunction` that runs its compiled body once the interpreter has one."""
+
+    def execute(self, interpreter, env):
+        compiled = interpreter.compiled_body(self.declaration, env)
+        if compiled is not None:
+            return compiled(interpreter, env)
+        return LoxFunction.execute(self, interpreter, env)
+
+
+class JitInterpreter(Interpreter):
+    """
+    The tree-walker with a second tier: functions are counted as they are
+    called, and once one reaches JIT_THRESHOLD calls its body is translated
+    to Python by FunctionTranslator, compiled, and run from then on in place
+    of walking the tree. Functions the translator doesn't support stay on
+    the tree-walker. Compiled code raises the same runtime errors on the
+    same tokens, so messages and lines don't change.
+
+    There is no on-stack replacement: a long loop in a function that is
+    called once stays interpreted.
+    """
+
+    function_class = JitFunction
+
+    def __init__(self, report, meter=None, threshold=JIT_THRESHOLD):
+        super().__init__(report, meter)
+        self.threshold = threshold
+        self.calls = {}
+        # id(declaration) -> (declaration, compiled body or None). Holding
+        # the declaration keeps its id from being reused.
+        self.compiled = {}
+
+    def compiled_body(self, declaration: Stmt.Function, env):
+        key = id(declaration)
+        entry = self.compiled.get(key)
+        if entry is not None:
+            return entry[1]
+
+        calls = self.calls.get(key, 0) + 1
+        self.calls[key] = calls
+        if calls < self.threshold:
+            return None
+
+        compiled = None
+        try:
+            # Methods get the receiver as an extra first argument.
+            is_method = declaration.has_environment and len(env.slots) > len(declaration.params)
+            compiled = compile_function(declaration, is_method, self.global_env.values, self.meter)
+        except Unsupported:
+            pass
+        self.compiled[key] = (declaration, compiled)
+        del self.calls[key]
+        return compiled
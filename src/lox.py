@@ -1,33 +1,97 @@
+import argparse
+import os
 import sys
 
 from scanner import Scanner
 from parser import Parser
-from interpreter import Interpreter
 from ast_printer import AstPrinter
+from inline_cache import print_cache_stats
+from metering import Meter
+from optimizer import Optimizer
+from program import ENGINES
+from program_cache import ProgramCache
+from type_feedback import print_specialization_stats
 import tokens
 from resolver import Resolver
+from type_inference import TypeInference
+
+
+class ArgumentParser(argparse.ArgumentParser):
+    """Exits with 64 (EX_USAGE) on a bad command line, as lox.py always has, rather than argparse's 2."""
+
+    def error(self, message):
+        self.print_usage(sys.stderr)
+        print(f"{self.prog}: error: {message}", file=sys.stderr)
+        sys.exit(64)
 
 
 class Lox:
 
-    def __init__(self):
+    def __init__(self, engine="tree", cache_stats=False, compile_cache=None, optimize=False,
+                 specialization_stats=False, meter=None, step_report=False):
+        self.cache_stats = cache_stats
+        self.specialization_stats = specialization_stats
+        self.meter = meter
+        self.step_report = step_report
+        self.optimize = optimize
+        self.compile_cache = compile_cache
         self.had_error = False
         self.had_runtime_error = False
         self.ast_printer = AstPrinter()
-        self.interpreter = Interpreter(self.runtime_error)
-
-    def main(self, args):
-        if len(args) > 1:
-            print("Usage: python lox.py [script]")
-            sys.exit(64)
-        elif len(args) == 1:
-            self.run_file(args[0])
+        self.interpreter = ENGINES[engine](self.runtime_error, meter)
+
+    @staticmethod
+    def parse_args(args):
+        arg_parser = ArgumentParser(prog="lox.py")
+        arg_parser.add_argument("script", nargs="?")
+        arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="tree",
+                                help="execution backend (default: tree)")
+        arg_parser.add_argument("--cache-stats", action="store_true",
+                                help="print inline cache hits and misses per property site, "
+                                     "and compile cache hits and misses, to stderr")
+        arg_parser.add_argument("--specialization-stats", action="store_true",
+                                help="print how each binary operator and call site was specialized "
+                                     "by the tree-walker to stderr")
+        arg_parser.add_argument("--optimize", action="store_true",
+                                help="fold constant expressions and drop dead branches before running")
+        arg_parser.add_argument("--compile-cache", action="store_true",
+                                help="reuse parsed and resolved scripts saved in the compile cache")
+        arg_parser.add_argument("--compile-cache-dir", metavar="DIR",
+                                help="compile cache directory (default: __loxcache__ next to the script)")
+        arg_parser.add_argument("--batch", metavar="PATH",
+                                help="run every .lox script in a directory, or listed in a manifest file, "
+                                     "on a pool of worker processes")
+        arg_parser.add_argument("-j", "--jobs", type=int, metavar="N",
+                                help="worker processes for --batch (default: one per core)")
+        arg_parser.add_argument("--max-steps", type=int, metavar="N",
+                                help="stop a script with a runtime error after it executes N statements")
+        arg_parser.add_argument("--timeout", type=float, metavar="SECONDS",
+                                help="stop a script with a runtime error after it runs for SECONDS")
+        arg_parser.add_argument("--step-report", action="store_true",
+                                help="print the statements executed and the time taken to stderr")
+        arg_parser.add_argument("--serve", action="store_true",
+                                help="stay resident and run scripts sent by lox_client.py over a Unix socket")
+        arg_parser.add_argument("--socket", metavar="PATH",
+                                help="socket for --serve (default: $LOX_SOCKET or /tmp/lox-UID.sock)")
+        options = arg_parser.parse_args(args)
+        if options.batch is not None and not os.path.exists(options.batch):
+            arg_parser.error(f"--batch: no such file or directory: {options.batch}")
+        if options.jobs is not None and options.jobs < 1:
+            arg_parser.error("-j/--jobs must be at least 1")
+        return options
+
+    def main(self, script):
+        if script is not None:
+            self.run_file(script)
         else:
             self.run_prompt()
 
     def run_file(self, file):
         data = open(file, 'r').read()
-        self.run(data)
+        if self.compile_cache is not None:
+            self.run_cached(data)
+        else:
+            self.run(data)
         if self.had_error:
             sys.exit(65)
         if self.had_runtime_error:
@@ -41,23 +105,54 @@ class Lox:
             self.hod_runtime_error = False
 
     def run(self, data):
+        statements = self.compile(data)
+        if statements is not None:
+            self.execute(statements)
+
+    def run_cached(self, data):
+        statements = self.compile_cache.load(data)
+        if statements is None:
+            statements = self.compile(data)
+            if statements is None:
+                return
+            self.compile_cache.store(data, statements)
+        self.execute(statements)
+
+    def compile(self, data):
+        """Scans, parses and resolves `data`, returning None if there were errors."""
         scanner = Scanner(data, self.lexer_error)
         tokens = scanner.scan_tokens()
 
         if self.had_error:
-            return
+            return None
         parser = Parser(tokens, self.parser_error)
         statements = parser.parse()
 
         if self.had_error:
-            return
+            return None
 
-        resolver = Resolver(self.interpreter, self.parser_error)
+        resolver = Resolver(self.parser_error)
         resolver.resolve(*statements)
 
         if self.had_error:
-            return
+            return None
+        TypeInference().infer(*statements)
+        return statements
+
+    def execute(self, statements):
+        if self.optimize:
+            statements = Optimizer().optimize(statements)
+        if self.meter is not None:
+            self.meter.start()
         self.interpreter.interpret(statements)
+        if self.step_report:
+            print(self.meter.report(), file=sys.stderr)
+        if self.cache_stats:
+            print_cache_stats(statements)
+            if self.compile_cache is not None:
+                self.compile_cache.print_stats()
+        if self.specialization_stats:
+            print_specialization_stats(statements)
 
     def lexer_error(self, line, message):
         self.report(line, "", message)
@@ -78,4 +173,25 @@ class Lox:
 
 
 if __name__ == '__main__':
-    Lox().main(sys.argv[1:])
+    options = Lox.parse_args(sys.argv[1:])
+    if options.serve:
+        from daemon import serve
+        sys.exit(serve(options.socket, options.engine, optimize=options.optimize, max_steps=options.max_steps,
+                       timeout=options.timeout))
+    if options.batch is not None:
+        from batch import run_batch
+        sys.exit(run_batch(options.batch, options.jobs, options.engine, optimize=options.optimize,
+                           compile_cache=options.compile_cache, compile_cache_dir=options.compile_cache_dir,
+                           max_steps=options.max_steps, timeout=options.timeout))
+    compile_cache = None
+    if options.compile_cache and options.script is not None:
+        directory = options.compile_cache_dir
+        if directory is None:
+            directory = os.path.join(os.path.dirname(os.path.abspath(options.script)), "__loxcache__")
+        compile_cache = ProgramCache(directory)
+    meter = None
+    if options.max_steps is not None or options.timeout is not None or options.step_report:
+        meter = Meter(options.max_steps, options.timeout)
+    Lox(options.engine, cache_stats=options.cache_stats, compile_cache=compile_cache,
+        optimize=options.optimize, specialization_stats=options.specialization_stats, meter=meter,
+        step_report=options.step_report).main(options.script)
@@ -2,52 +2,92 @@ from errors import LoxRuntimeError
 from lox_function import LoxFunction
 from tokens import Token
 
+class Shape:
+    """
+    A field layout shared by every instance that added the same fields in the
+    same order. Instances keep only a list of values; the shape maps field
+    names to offsets in that list and remembers the shape reached by adding
+    each further field, so instances built the same way converge on the same
+    shape objects.
+    """
+
+    __slots__ = ("offsets", "transitions")
+
+    def __init__(self, offsets):
+        self.offsets = offsets
+        self.transitions = {}
+
+    def with_field(self, name):
+        shape = self.transitions.get(name)
+        if shape is None:
+            offsets = dict(self.offsets)
+            offsets[name] = len(offsets)
+            shape = Shape(offsets)
+            self.transitions[name] = shape
+        return shape
+
+
 class LoxClass:
     def __init__(self, name: Token, superclass, methods):
         self.name = name
         self.superclass = superclass
         self.methods = methods
+        self.root_shape = Shape({})
+
+        # A class's methods are fixed once it is defined, so inherited and
+        # own methods are flattened into one table up front.
+        self.method_table = {}
+        if superclass is not None:
+            self.method_table.update(superclass.method_table)
+        self.method_table.update(methods)
+
+        self.initializer = self.method_table.get('init')
+        self.initializer_arity = 0
+        if self.initializer is not None:
+            self.initializer_arity = self.initializer.arity()
 
     def to_string(self):
         return self.name.lexeme
 
     def call(self, interpreter, arguments):
         instance = LoxInstance(self)
-        initializer = self.find_method('init')
-        if initializer is not None:
-            initializer.bind(instance).call(interpreter, arguments)
+        if self.initializer is not None:
+            self.initializer.invoke(interpreter, instance, arguments)
         return instance
 
     def arity(self):
-        initializer = self.find_method('init')
-        if initializer is not None:
-            return initializer.arity()
-        return 0
+        return self.initializer_arity
 
     def find_method(self, name):
-        method = self.methods.get(name)
-        if method is None and self.superclass is not None:
-            return self.superclass.find_method(name)
-        return method
+        return self.method_table.get(name)
 
 
 class LoxInstance:
+    __slots__ = ("klass", "shape", "values")
+
     def __init__(self, klass: LoxClass):
         self.klass = klass
-        self.fields = {}
+        self.shape = klass.root_shape
+        self.values = []
 
     def to_string(self):
         return f"{self.klass.to_string()} instance"
 
     def get(self, name: Token):
-        if name.lexeme in self.fields:
-            return self.fields[name.lexeme]
+        offset = self.shape.offsets.get(name.lexeme)
+        if offset is not None:
+            return self.values[offset]
 
-        method = self.klass.find_method(name.lexeme)
+        method = self.klass.method_table.get(name.lexeme)
         if method is not None:
             return method.bind(self)
 
         raise LoxRuntimeError(name, f"Undefined property {name.lexeme}.")
 
     def set(self, name, value):
-        self.fields[name.lexeme] = value
+        offset = self.shape.offsets.get(name.lexeme)
+        if offset is None:
+            self.shape = self.shape.with_field(name.lexeme)
+            self.values.append(value)
+        else:
+            self.values[offset] = value
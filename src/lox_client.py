@@ -0,0 +1,66 @@
+"""
+Runs a script on a warm `lox.py --serve` daemon instead of starting an
+interpreter, printing what it prints and exiting with its status.
+
+    python src/lox_client.py [--socket PATH] script
+    python src/lox_client.py [--socket PATH] -c source
+
+Only the standard library is imported here, so the client starts in a few
+milliseconds.
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+
+
+def default_socket():
+    return os.environ.get("LOX_SOCKET", f"/tmp/lox-{os.getuid()}.sock")
+
+
+def request(socket_path, message, out=sys.stdout, err=sys.stderr):
+    """
+    Sends one request to the daemon and copies the output it streams back to
+    `out` and `err`, returning the script's exit status.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        with connection.makefile("rw", encoding="utf-8") as stream:
+            stream.write(json.dumps(message) + "\n")
+            stream.flush()
+            for line in stream:
+                frame = json.loads(line)
+                if "out" in frame:
+                    out.write(frame["out"])
+                elif "err" in frame:
+                    err.write(frame["err"])
+                else:
+                    return frame["status"]
+    err.write("Connection to the Lox daemon closed before the script finished.\n")
+    return 1
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser(prog="lox_client.py")
+    arg_parser.add_argument("script", nargs="?")
+    arg_parser.add_argument("-c", dest="source", help="run SOURCE instead of a script file")
+    arg_parser.add_argument("--socket", default=default_socket(),
+                            help="daemon socket (default: $LOX_SOCKET or /tmp/lox-UID.sock)")
+    options = arg_parser.parse_args(args)
+    if options.source is not None:
+        message = {"source": options.source}
+    elif options.script is not None:
+        message = {"path": os.path.abspath(options.script)}
+    else:
+        arg_parser.error("a script or -c SOURCE is required")
+
+    try:
+        return request(options.socket, message)
+    except OSError as e:
+        print(f"Can't reach the Lox daemon at {options.socket}: {e.strerror or e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
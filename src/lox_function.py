@@ -1,31 +1,71 @@
 import statements as Stmt
-from environment import Environment
-from errors import Return
-from tokens import Token, THIS
+from environment import Cell, Environment
 
-this_token = Token(THIS, "this", "this", -1)
 
 class LoxFunction:
+    """
+    A function value. Rather than the environment it was declared in, it
+    keeps just the cells of the variables it captured, as listed by its
+    declaration's `upvalues`.
+    """
 
-    def __init__(self, declaration: Stmt.Function, closure: Environment, is_initializer=False):
-        self.closure = closure
+    def __init__(self, declaration: Stmt.Function, cells, is_initializer=False):
+        self.cells = cells
         self.declaration = declaration
         self.is_initializer = is_initializer
 
-    def call(self, interpreter, arguments):
-        env = Environment(self.closure)
-        for i, param in enumerate(self.declaration.params):
-            arg = arguments[i]
-            env.define(param, arg)
+    def invoke(self, interpreter, instance, arguments):
+        """
+        Calls this function as a method of `instance`. The receiver is placed
+        in the first slot of the call's environment, where the resolver
+        expects `this`, so no bound method needs to be created.
+        """
+        arguments.insert(0, instance)
+        return self.run(interpreter, arguments, instance)
 
-        try:
-            interpreter.execute_block(self.declaration.body, env)
-        except Return as return_value:
-            if self.is_initializer:
-                return self.closure.get_at(0, this_token)
-            return return_value.value
+    def tail_call(self, arguments):
+        return TailCall(self, None, arguments)
+
+    def tail_invoke(self, instance, arguments):
+        arguments.insert(0, instance)
+        return TailCall(self, instance, arguments)
 
-        if self.is_initializer: return self.closure.get_at(0, this_token)
+    def run(self, interpreter, arguments, instance=None):
+        """
+        Executes the body, and then whatever function the body returned a
+        `TailCall` to, in a loop, so a chain of tail calls runs in one Python
+        frame however long it gets. A plain call comes straight here, as
+        `call`, to keep the Python frames per Lox call down.
+        """
+        function = self
+        while True:
+            env = None
+            declaration = function.declaration
+            if declaration.has_environment:
+                for slot in declaration.cell_slots:
+                    arguments[slot] = Cell(arguments[slot])
+                env = Environment(None, arguments, function.cells)
+            value = function.execute(interpreter, env)
+            if function.is_initializer:
+                return instance
+            if type(value) is not TailCall:
+                return value
+            function, instance, arguments = value.function, value.instance, value.arguments
+
+    call = run
+
+    def execute(self, interpreter, env):
+        # The body is run here rather than through execute_block, which
+        # would cost two more Python frames per call.
+        previous = interpreter.environment
+        interpreter.environment = env
+        try:
+            for stmt in self.declaration.body:
+                completion = interpreter.execute(stmt)
+                if completion is not None:
+                    return completion.value
+        finally:
+            interpreter.environment = previous
         return None
 
     def arity(self):
@@ -35,6 +75,52 @@ class LoxFunction:
         return f"<fn {self.declaration.name.lexeme}>"
 
     def bind(self, instance):
-        env = Environment(self.closure)
-        env.define(this_token, instance)
-        return LoxFunction(self.declaration, env, is_initializer=self.is_initializer)
+        return BoundMethod(self, instance)
+
+
+class BoundMethod:
+    """A method that has been read off an instance as a value."""
+
+    def __init__(self, method: LoxFunction, instance):
+        self.method = method
+        self.instance = instance
+
+    def call(self, interpreter, arguments):
+        return self.method.invoke(interpreter, self.instance, arguments)
+
+    def tail_call(self, arguments):
+        return self.method.tail_invoke(self.instance, arguments)
+
+    def arity(self):
+        return self.method.arity()
+
+    def to_string(self):
+        return self.method.to_string()
+
+
+class TailCall:
+    """
+    A call in tail position that has not been made yet. A `return f(...)`
+    marked by the Resolver returns one of these instead of calling `f`, and
+    the `LoxFunction.run` loop it returns to makes the call in its place.
+    """
+
+    __slots__ = ("function", "instance", "arguments")
+
+    def __init__(self, function: LoxFunction, instance, arguments):
+        self.function = function
+        self.instance = instance
+        self.arguments = arguments
+
+
+class Return:
+    """
+    The completion of a `return` statement. Executing a statement produces
+    None when it finishes normally; blocks, ifs and loops stop and hand a
+    Return up unchanged until it reaches the function being executed.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
@@ -0,0 +1,98 @@
+import dataclasses
+import math
+import time
+
+import tokens
+from errors import LoxRuntimeError
+
+# Steps between looks at the clock when there is a deadline.
+CLOCK_INTERVAL = 1000
+
+
+class LimitExceeded(LoxRuntimeError):
+    """Raised when a metered script runs past its step budget or its deadline."""
+
+
+class Meter:
+    """
+    Counts the statements a script executes, one step each, and stops it
+    with LimitExceeded once it has taken `budget` steps or run for `timeout`
+    seconds.
+
+    Engines created with a meter count inline at each statement,
+    `steps += 1` and a comparison against `limit`, and call `check` when
+    the count reaches it. `limit` is the budget, or sooner when there is a
+    deadline, so the clock is only read every CLOCK_INTERVAL steps. Engines
+    without a meter don't count at all.
+
+    `start` resets the count for a new run; `steps` and `elapsed` report on
+    the last one.
+    """
+
+    __slots__ = ("budget", "timeout", "steps", "limit", "started", "deadline")
+
+    def __init__(self, budget=None, timeout=None):
+        self.budget = budget
+        self.timeout = timeout
+        self.start()
+
+    def start(self):
+        self.steps = 0
+        self.started = time.monotonic()
+        self.deadline = None if self.timeout is None else self.started + self.timeout
+        self.limit = self.next_limit()
+
+    def next_limit(self):
+        # The step after the last one the budget allows.
+        limit = math.inf if self.budget is None else self.budget + 1
+        if self.deadline is not None:
+            limit = min(limit, self.steps + CLOCK_INTERVAL)
+        return limit
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def check(self, node):
+        """Called with the statement, or its token, that brought `steps` to `limit`."""
+        if self.budget is not None and self.steps > self.budget:
+            raise LimitExceeded(first_token(node), f"Step budget of {self.budget} exceeded.")
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise self.out_of_time(node)
+        self.limit = self.next_limit()
+
+    def time_left(self):
+        """Seconds until the deadline, or None if there isn't one."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def out_of_time(self, node):
+        return LimitExceeded(first_token(node), f"Time limit of {self.timeout}s exceeded.")
+
+    def report(self):
+        return f"{self.steps} steps in {self.elapsed * 1000:.1f}ms"
+
+
+def first_token(node):
+    """The first token in the syntax tree rooted at `node`, to report a limit against."""
+    token = find_token(node)
+    if token is None:
+        return tokens.Token(tokens.EOF, "", None, 0)
+    return token
+
+
+def find_token(node):
+    if isinstance(node, tokens.Token):
+        return node
+    if isinstance(node, (list, tuple)):
+        children = node
+    elif dataclasses.is_dataclass(node):
+        children = [getattr(node, field.name) for field in dataclasses.fields(node)]
+    else:
+        children = ()
+    for child in children:
+        token = find_token(child)
+        if token is not None:
+            return token
+    return None
@@ -0,0 +1,186 @@
+import dataclasses
+import math
+import operator
+
+import expressions as Expr
+import statements as Stmt
+import tokens
+from metering import first_token
+
+NUMERIC_OPERATORS = {
+    tokens.PLUS: operator.add,
+    tokens.MINUS: operator.sub,
+    tokens.STAR: operator.mul,
+    tokens.SLASH: operator.truediv,
+    tokens.GREATER: operator.gt,
+    tokens.GREATER_EQUAL: operator.ge,
+    tokens.LESS: operator.lt,
+    tokens.LESS_EQUAL: operator.le,
+}
+
+
+def is_truthy(value):
+    return value is not None and value is not False
+
+
+class Optimizer:
+    """
+    Rewrites resolved statements: folds operators whose operands are all
+    literals, drops `if`/`while` branches whose condition is a literal that
+    rules them out, and strips Grouping nodes. Anything that would raise at
+    runtime, such as `"a" - 1` or a division by zero, is left for the
+    interpreter so the error and its line are unchanged.
+
+    Nodes are rebuilt with `dataclasses.replace`, which keeps the Resolver's
+    depth/slot and tail call marks. Removing a branch never removes a
+    declaration from an enclosing scope, since branches are statements, not
+    declarations, so resolved slots stay valid.
+    """
+
+    def optimize(self, statements: [Stmt.Stmt]):
+        return self.optimize_list(statements)
+
+    def optimize_list(self, statements):
+        optimized = []
+        for statement in statements:
+            statement = statement.accept(self)
+            if statement is not None:
+                optimized.append(statement)
+        return optimized
+
+    def optimize_branch(self, statement):
+        # A branch can't be left empty, so a removed one becomes an empty block.
+        optimized = statement.accept(self)
+        if optimized is None:
+            return Stmt.Block(first_token(statement), [], environment=Stmt.NO_ENVIRONMENT)
+        return optimized
+
+    def fold(self, expr):
+        return expr.accept(self)
+
+    def visit_block_stmt(self, stmt: Stmt.Block):
+        return dataclasses.replace(stmt, statements=self.optimize_list(stmt.statements))
+
+    def visit_class_stmt(self, stmt: Stmt.Class):
+        return dataclasses.replace(stmt, methods=[self.visit_function_stmt(method) for method in stmt.methods])
+
+    def visit_expression_stmt(self, stmt: Stmt.Expression):
+        expression = self.fold(stmt.expression)
+        if isinstance(expression, Expr.Literal):
+            return None
+        return dataclasses.replace(stmt, expression=expression)
+
+    def visit_function_stmt(self, stmt: Stmt.Function):
+        return dataclasses.replace(stmt, body=self.optimize_list(stmt.body))
+
+    def visit_if_stmt(self, stmt: Stmt.If):
+        condition = self.fold(stmt.condition)
+        if isinstance(condition, Expr.Literal):
+            if is_truthy(condition.value):
+                return stmt.then_branch.accept(self)
+            if stmt.else_branch is not None:
+                return stmt.else_branch.accept(self)
+            return None
+
+        else_branch = None
+        if stmt.else_branch is not None:
+            else_branch = self.optimize_branch(stmt.else_branch)
+        return dataclasses.replace(stmt, condition=condition,
+                                   then_branch=self.optimize_branch(stmt.then_branch),
+                                   else_branch=else_branch)
+
+    def visit_print_stmt(self, stmt: Stmt.Print):
+        return dataclasses.replace(stmt, expression=self.fold(stmt.expression))
+
+    def visit_return_stmt(self, stmt: Stmt.Return):
+        if stmt.value is None:
+            return stmt
+        return dataclasses.replace(stmt, value=self.fold(stmt.value))
+
+    def visit_var_stmt(self, stmt: Stmt.Var):
+        if stmt.initializer is None:
+            return stmt
+        return dataclasses.replace(stmt, initializer=self.fold(stmt.initializer))
+
+    def visit_while_stmt(self, stmt: Stmt.While):
+        condition = self.fold(stmt.condition)
+        if isinstance(condition, Expr.Literal) and not is_truthy(condition.value):
+            return None
+        return dataclasses.replace(stmt, condition=condition, body=self.optimize_branch(stmt.body))
+
+    def visit_assign_expr(self, expr: Expr.Assign):
+        return dataclasses.replace(expr, value=self.fold(expr.value))
+
+    def visit_binary_expr(self, expr: Expr.Binary):
+        left = self.fold(expr.left)
+        right = self.fold(expr.right)
+        if isinstance(left, Expr.Literal) and isinstance(right, Expr.Literal):
+            folded = self.fold_binary(expr.operator.token_type, left.value, right.value)
+            if folded is not None:
+                return folded
+        return dataclasses.replace(expr, left=left, right=right)
+
+    def fold_binary(self, token_type, a, b):
+        """Returns the Literal `a <op> b` evaluates to, or None to leave it to runtime."""
+        if token_type == tokens.EQUAL_EQUAL:
+            return Expr.Literal(a == b)
+        if token_type == tokens.BANG_EQUAL:
+            return Expr.Literal(not a == b)
+        if token_type == tokens.PLUS and type(a) is str and type(b) is str:
+            return Expr.Literal(a + b)
+        if type(a) is not float or type(b) is not float:
+            return None
+        if token_type == tokens.SLASH and b == 0:
+            return None
+        return self.number(NUMERIC_OPERATORS[token_type](a, b))
+
+    def number(self, value):
+        # The VM's constant table can't tell -0.0 from 0.0, so leave those be.
+        if value == 0 and math.copysign(1.0, value) < 0:
+            return None
+        return Expr.Literal(value)
+
+    def visit_call_expr(self, expr: Expr.Call):
+        return dataclasses.replace(expr, callee=self.fold(expr.callee),
+                                   arguments=[self.fold(argument) for argument in expr.arguments])
+
+    def visit_get_expr(self, expr: Expr.Get):
+        return dataclasses.replace(expr, object=self.fold(expr.object))
+
+    def visit_grouping_expr(self, expr: Expr.Grouping):
+        return self.fold(expr.expression)
+
+    def visit_literal_expr(self, expr: Expr.Literal):
+        return expr
+
+    def visit_logical_expr(self, expr: Expr.Logical):
+        left = self.fold(expr.left)
+        right = self.fold(expr.right)
+        if isinstance(left, Expr.Literal):
+            if expr.operator.token_type == tokens.OR:
+                return left if is_truthy(left.value) else right
+            return right if is_truthy(left.value) else left
+        return dataclasses.replace(expr, left=left, right=right)
+
+    def visit_set_expr(self, expr: Expr.Set):
+        return dataclasses.replace(expr, object=self.fold(expr.object), value=self.fold(expr.value))
+
+    def visit_super_expr(self, expr: Expr.Super):
+        return expr
+
+    def visit_this_expr(self, expr: Expr.This):
+        return expr
+
+    def visit_unary_expr(self, expr: Expr.Unary):
+        right = self.fold(expr.right)
+        if isinstance(right, Expr.Literal):
+            if expr.operator.token_type == tokens.BANG:
+                return Expr.Literal(not is_truthy(right.value))
+            if expr.operator.token_type == tokens.MINUS and type(right.value) is float:
+                folded = self.number(-right.value)
+                if folded is not None:
+                    return folded
+        return dataclasses.replace(expr, right=right)
+
+    def visit_variable_expr(self, expr: Expr.Variable):
+        return expr
@@ -3,11 +3,23 @@ import expressions as Expr
 import statements as Stmt
 from errors import ParserError
 
+# How tightly each infix operator binds, loosest first.
+PREC_ASSIGNMENT = 1
+PREC_OR = 2
+PREC_AND = 3
+PREC_EQUALITY = 4
+PREC_COMPARISON = 5
+PREC_TERM = 6
+PREC_FACTOR = 7
+PREC_UNARY = 8
+PREC_CALL = 9
+
 
 class Parser:
 
     def __init__(self, tokens, report):
         self.tokens = tokens
+        self.types = tokens.types
         self.current = 0
         self.report = report
 
@@ -21,15 +33,17 @@ class Parser:
         return statements
 
     def match(self, *token_types):
-        for token_type in token_types:
-            if self.check(token_type):
-                self.advance()
-                return True
+        # Checks the type column directly; the Token itself is only built if
+        # the caller asks for it with previous().
+        if self.types[self.current] in token_types:
+            if not self.is_at_end():
+                self.current += 1
+            return True
 
         return False
 
     def check(self, token_type):
-        return self.peek().token_type == token_type
+        return self.types[self.current] == token_type
 
     def advance(self):
         if not self.is_at_end():
@@ -37,7 +51,7 @@ class Parser:
         return self.previous()
 
     def is_at_end(self):
-        return self.peek().token_type == tokens.EOF
+        return self.types[self.current] == tokens.EOF
 
     def peek(self):
         return self.tokens[self.current]
@@ -112,6 +126,7 @@ class Parser:
         return self.expression_statement()
 
     def if_statement(self):
+        keyword = self.previous()
         self.consume(tokens.LEFT_PAREN, "Expect '(' after 'if'.")
         condition = self.expression()
         self.consume(tokens.RIGHT_PAREN, "Expect ')' after condition.")
@@ -120,15 +135,16 @@ class Parser:
         if self.match(tokens.ELSE):
             else_branch = self.statement()
 
-        return Stmt.If(condition, then_branch, else_branch)
+        return Stmt.If(keyword, condition, then_branch, else_branch)
 
     def block_statement(self):
+        brace = self.previous()
         statements = []
         while not self.check(tokens.RIGHT_BRACE) and not self.is_at_end():
             statements.append(self.declaration())
 
         self.consume(tokens.RIGHT_BRACE, "Expect '}' at end of block.")
-        return Stmt.Block(statements)
+        return Stmt.Block(brace, statements)
 
     def expression_statement(self):
         expr = self.expression()
@@ -150,14 +166,16 @@ class Parser:
         return Stmt.Return(keyword, value)
 
     def while_statement(self):
+        keyword = self.previous()
         self.consume(tokens.LEFT_PAREN, "Expect '(' after 'while'")
         condition = self.expression()
         self.consume(tokens.RIGHT_PAREN, "Expect ')' after condition")
         statement = self.statement()
 
-        return Stmt.While(condition, statement)
+        return Stmt.While(keyword, condition, statement)
 
     def for_statement(self):
+        keyword = self.previous()
         self.consume(tokens.LEFT_PAREN, "Expect '(' after 'for'.")
 
         initializer = None
@@ -185,116 +203,70 @@ class Parser:
         body = self.statement()
 
         if increment is not None:
-            body = Stmt.Block([body, Stmt.Expression(increment)])
+            body = Stmt.Block(keyword, [body, Stmt.Expression(increment)])
 
         if condition is not None:
-            body = Stmt.While(condition, body)
+            body = Stmt.While(keyword, condition, body)
 
         if initializer is not None:
-            body = Stmt.Block([initializer, body])
+            body = Stmt.Block(keyword, [initializer, body])
 
         return body
 
     def expression(self):
-        return self.assignment()
-
-    def assignment(self):
-        expr = self.logical_or()
-
-        if self.match(tokens.EQUAL):
-            equals = self.previous()
-            value = self.assignment()
-            name = expr.name
-
-            if isinstance(expr, Expr.Variable):
-                return Expr.Assign(name, value)
-            elif isinstance(expr, Expr.Get):
-                return Expr.Set(expr.object, name, value)
-
-            self.error(equals, "Invalid Assignment Target")
-
-        return expr
-
-    def logical_or(self):
-        expr = self.logical_and()
-
-        while self.match(tokens.OR):
-            operator = self.previous()
-            right = self.logical_and()
-            expr = Expr.Logical(expr, operator, right)
-
-        return expr
-
-    def logical_and(self):
-        expr = self.equality()
-
-        while self.match(tokens.AND):
-            operator = self.previous()
-            right = self.equality()
-            expr = Expr.Logical(expr, operator, right)
-
-        return expr
+        return self.parse_precedence(PREC_ASSIGNMENT)
+
+    def parse_precedence(self, precedence):
+        """
+        Parses an expression whose operators all bind at least as tightly as
+        `precedence`. The current token's prefix rule parses the first
+        operand, then infix rules extend it for as long as the next operator
+        binds tightly enough.
+        """
+        prefix = PREFIX_RULES.get(self.types[self.current])
+        if prefix is None:
+            raise self.error(self.peek(), "Expect expression.")
+        self.current += 1
+        expr = prefix(self)
 
-    def equality(self):
-        expr = self.comparison()
-        while self.match(tokens.BANG_EQUAL, tokens.EQUAL_EQUAL):
-            operator = self.previous()
-            right = self.comparison()
-            expr = Expr.Binary(left=expr, operator=operator, right=right)
+        while True:
+            rule = INFIX_RULES.get(self.types[self.current])
+            if rule is None or rule[1] < precedence:
+                return expr
+            self.current += 1
+            expr = rule[0](self, expr)
 
-        return expr
+    def assignment(self, expr: Expr):
+        equals = self.previous()
+        # Right associative: the value may itself be an assignment.
+        value = self.parse_precedence(PREC_ASSIGNMENT)
 
-    def comparison(self):
-        expr = self.term()
-        while self.match(tokens.GREATER,
-                         tokens.GREATER_EQUAL,
-                         tokens.LESS,
-                         tokens.LESS_EQUAL):
-            operator = self.previous()
-            right = self.term()
-            expr = Expr.Binary(left=expr, operator=operator, right=right)
+        if isinstance(expr, Expr.Variable):
+            return Expr.Assign(expr.name, value)
+        elif isinstance(expr, Expr.Get):
+            return Expr.Set(expr.object, expr.name, value)
 
+        self.error(equals, "Invalid Assignment Target")
         return expr
 
-    def term(self):
-        expr = self.factor()
-        while self.match(tokens.PLUS, tokens.MINUS):
-            operator = self.previous()
-            right = self.factor()
-            expr = Expr.Binary(left=expr, operator=operator, right=right)
-
-        return expr
+    def logical(self, left: Expr):
+        operator = self.previous()
+        right = self.parse_precedence(INFIX_RULES[operator.token_type][1] + 1)
+        return Expr.Logical(left, operator, right)
 
-    def factor(self):
-        expr = self.unary()
-        while self.match(tokens.STAR, tokens.SLASH):
-            operator = self.previous()
-            right = self.unary()
-            expr = Expr.Binary(left=expr, operator=operator, right=right)
-
-        return expr
+    def binary(self, left: Expr):
+        operator = self.previous()
+        right = self.parse_precedence(INFIX_RULES[operator.token_type][1] + 1)
+        return Expr.Binary(left=left, operator=operator, right=right)
 
     def unary(self):
-        if self.match(tokens.MINUS, tokens.BANG):
-            operator = self.previous()
-            right = self.unary()
-            return Expr.Unary(operator=operator, right=right)
-
-        return self.call()
-
-    def call(self):
-        expr = self.primary()
+        operator = self.previous()
+        right = self.parse_precedence(PREC_UNARY)
+        return Expr.Unary(operator=operator, right=right)
 
-        while True:
-            if self.match(tokens.LEFT_PAREN):
-                expr = self.finish_call(expr)
-            elif self.match(tokens.DOT):
-                name = self.consume(tokens.IDENTIFIER, "Expect property name after '.")
-                expr = Expr.Get(expr, name)
-            else:
-                break
-
-        return expr
+    def get(self, obj: Expr):
+        name = self.consume(tokens.IDENTIFIER, "Expect property name after '.")
+        return Expr.Get(obj, name)
 
     def finish_call(self, expr: Expr):
         arguments = []
@@ -308,31 +280,32 @@ class Parser:
 
         return Expr.Call(expr, paren, arguments)
 
-    def primary(self):
-        if self.match(tokens.FALSE):
-            return Expr.Literal(False)
-        if self.match(tokens.TRUE):
-            return Expr.Literal(True)
-        if self.match(tokens.NIL):
-            return Expr.Literal(None)
-        if self.match(tokens.NUMBER, tokens.STRING):
-            return Expr.Literal(self.previous().literal)
-        if self.match(tokens.SUPER):
-            keyword = self.previous()
-            self.consume(tokens.DOT, "Expect '.' after 'super'.")
-            method = self.consume(tokens.IDENTIFIER, "Expect superclass method name.")
-            return Expr.Super(keyword, method)
-        if self.match(tokens.THIS):
-            return Expr.This(self.previous())
-        if self.match(tokens.IDENTIFIER):
-            return Expr.Variable(self.previous())
+    def literal(self):
+        token = self.previous()
+        if token.token_type == tokens.FALSE:
+            return Expr.Literal(False, token=token)
+        if token.token_type == tokens.TRUE:
+            return Expr.Literal(True, token=token)
+        if token.token_type == tokens.NIL:
+            return Expr.Literal(None, token=token)
+        return Expr.Literal(token.literal, token=token)
+
+    def super_expression(self):
+        keyword = self.previous()
+        self.consume(tokens.DOT, "Expect '.' after 'super'.")
+        method = self.consume(tokens.IDENTIFIER, "Expect superclass method name.")
+        return Expr.Super(keyword, method)
 
-        if self.match(tokens.LEFT_PAREN):
-            expr = self.expression()
-            self.consume(tokens.RIGHT_PAREN, "Expect ')' after expression")
-            return Expr.Grouping(expr)
+    def this_expression(self):
+        return Expr.This(self.previous())
 
-        raise self.error(self.peek(), "Expect expression.")
+    def variable(self):
+        return Expr.Variable(self.previous())
+
+    def grouping(self):
+        expr = self.expression()
+        self.consume(tokens.RIGHT_PAREN, "Expect ')' after expression")
+        return Expr.Grouping(expr)
 
     def consume(self, token_type, message):
         if self.check(token_type):
@@ -361,3 +334,39 @@ class Parser:
                 return
 
             self.advance()
+
+
+# The Pratt parser's tables: the method that parses an expression starting
+# with a token, and the method and precedence for a token that continues
+# one.
+PREFIX_RULES = {
+    tokens.FALSE: Parser.literal,
+    tokens.TRUE: Parser.literal,
+    tokens.NIL: Parser.literal,
+    tokens.NUMBER: Parser.literal,
+    tokens.STRING: Parser.literal,
+    tokens.SUPER: Parser.super_expression,
+    tokens.THIS: Parser.this_expression,
+    tokens.IDENTIFIER: Parser.variable,
+    tokens.LEFT_PAREN: Parser.grouping,
+    tokens.MINUS: Parser.unary,
+    tokens.BANG: Parser.unary,
+}
+
+INFIX_RULES = {
+    tokens.EQUAL: (Parser.assignment, PREC_ASSIGNMENT),
+    tokens.OR: (Parser.logical, PREC_OR),
+    tokens.AND: (Parser.logical, PREC_AND),
+    tokens.BANG_EQUAL: (Parser.binary, PREC_EQUALITY),
+    tokens.EQUAL_EQUAL: (Parser.binary, PREC_EQUALITY),
+    tokens.GREATER: (Parser.binary, PREC_COMPARISON),
+    tokens.GREATER_EQUAL: (Parser.binary, PREC_COMPARISON),
+    tokens.LESS: (Parser.binary, PREC_COMPARISON),
+    tokens.LESS_EQUAL: (Parser.binary, PREC_COMPARISON),
+    tokens.PLUS: (Parser.binary, PREC_TERM),
+    tokens.MINUS: (Parser.binary, PREC_TERM),
+    tokens.STAR: (Parser.binary, PREC_FACTOR),
+    tokens.SLASH: (Parser.binary, PREC_FACTOR),
+    tokens.LEFT_PAREN: (Parser.finish_call, PREC_CALL),
+    tokens.DOT: (Parser.get, PREC_CALL),
+}
@@ -0,0 +1,177 @@
+import asyncio
+import io
+
+import tokens
+from async_vm import AsyncVM
+from closure_compiler import ClosureCompiler
+from inline_cache import cached_sites
+from interpreter import Interpreter
+from jit import JitInterpreter
+from optimizer import Optimizer
+from parser import Parser
+from resolver import Resolver
+from scanner import Scanner
+from type_inference import TypeInference
+from vm import VM
+
+ENGINES = {
+    "tree": Interpreter,
+    "jit": JitInterpreter,
+    "closure": ClosureCompiler,
+    "vm": VM,
+    "async": AsyncVM,
+}
+
+
+class CompileError(Exception):
+    """Raised by `compile` for source with errors, which are listed in `errors` as Lox reports them."""
+
+    def __init__(self, errors):
+        super().__init__("\n".join(errors))
+        self.errors = errors
+
+
+class Result:
+    """
+    What one run of a Program produced: everything it printed, the global
+    variables it left behind, the LoxRuntimeError that stopped it, if any,
+    and for a metered Program the statements it executed.
+    """
+
+    __slots__ = ("output", "globals", "error", "steps")
+
+    def __init__(self, output, globals, error, steps=None):
+        self.output = output
+        self.globals = globals
+        self.error = error
+        self.steps = steps
+
+    @property
+    def exit_status(self):
+        """The status `lox.py` would exit with."""
+        return 70 if self.error is not None else 0
+
+
+def compile(source, engine="tree", optimize=False, meter=None):
+    """
+    Scans, parses, resolves and (with `optimize`) folds `source` into a
+    Program for `engine`, metered by `meter` if given, raising CompileError
+    if there were errors.
+    """
+    errors = []
+
+    def lexer_error(line, message):
+        errors.append(f"[line {line}] Error: {message}")
+
+    def parser_error(token, message):
+        where = " at end" if token.token_type == tokens.EOF else f" at '{token.lexeme}' "
+        errors.append(f"[line {token.line}] Error{where}: {message}")
+
+    token_buffer = Scanner(source, lexer_error).scan_tokens()
+    if errors:
+        raise CompileError(errors)
+    statements = Parser(token_buffer, parser_error).parse()
+    if errors:
+        raise CompileError(errors)
+    Resolver(parser_error).resolve(*statements)
+    if errors:
+        raise CompileError(errors)
+    TypeInference().infer(*statements)
+    if optimize:
+        statements = Optimizer().optimize(statements)
+    return Program(statements, engine, meter)
+
+
+def to_lox(value):
+    # Lox numbers are floats; a Python int would fail its type checks.
+    if type(value) is int:
+        return float(value)
+    return value
+
+
+class Program:
+    """
+    A script compiled once and run any number of times, for embedding the
+    interpreter. The engine is set up, and for `closure` and `vm` the
+    statements compiled, when the Program is created, so each run only
+    executes.
+
+    Every run starts from fresh globals: the builtins plus any `globals`
+    passed in, which is how a script gets its inputs. It returns a Result
+    rather than printing: the output is captured, and the globals the
+    script defined are handed back. Inline caches are cleared before each
+    run, as every run creates its classes anew.
+
+    With a Meter, each run is limited by its budget and timeout, stopping
+    with a LimitExceeded error past them, and reports its steps.
+
+    A Program runs one script at a time; give each thread its own.
+    """
+
+    def __init__(self, statements, engine="tree", meter=None):
+        self.statements = statements
+        self.error = None
+        self.meter = meter
+        self.engine = ENGINES[engine](self.runtime_error, meter)
+        self.builtins = dict(self.engine.global_env.values)
+        self.caches = [cache for _, cache in cached_sites(statements)]
+        self.entry = self.engine.prepare(statements)
+        self.awaits = asyncio.iscoroutinefunction(self.entry)
+
+    def run(self, globals=None, output=None):
+        """
+        Runs the script, returning a Result. What it prints is captured
+        into `Result.output`, or written to `output` if given, in which case
+        `Result.output` is None.
+        """
+        if self.awaits:
+            return asyncio.run(self.run_async(globals, output))
+        sink = self.start(globals, output)
+        try:
+            self.entry()
+        finally:
+            self.engine.output = None
+        return self.finish(sink, output)
+
+    async def run_async(self, globals=None, output=None):
+        """
+        Like `run`, but awaited on the running event loop. On the `async`
+        engine the script lets other tasks run whenever it waits on a native
+        such as `sleep`; other engines run it in one go. Scripts running
+        concurrently each need a Program, which can share the statements of
+        another: `Program(other.statements, "async")`.
+        """
+        sink = self.start(globals, output)
+        try:
+            if self.awaits:
+                await self.entry()
+            else:
+                self.entry()
+        finally:
+            self.engine.output = None
+        return self.finish(sink, output)
+
+    def start(self, globals, output):
+        # Compiled code holds on to this dict, so it is refilled in place.
+        values = self.engine.global_env.values
+        values.clear()
+        values.update(self.builtins)
+        if globals is not None:
+            for name, value in globals.items():
+                values[name] = to_lox(value)
+        for cache in self.caches:
+            cache.reset()
+        if self.meter is not None:
+            self.meter.start()
+
+        self.error = None
+        self.engine.output = output if output is not None else io.StringIO()
+        return self.engine.output
+
+    def finish(self, sink, output):
+        steps = self.meter.steps if self.meter is not None else None
+        return Result(sink.getvalue() if output is None else None, dict(self.engine.global_env.values), self.error,
+                      steps)
+
+    def runtime_error(self, error):
+        self.error = error
@@ -0,0 +1,72 @@
+import hashlib
+import os
+import pickle
+import sys
+
+# Modules whose code decides what a cached program looks like. Cached
+# programs are only reused by the same versions of these and of Python.
+FRONT_END_MODULES = ("tokens", "scanner", "parser", "resolver", "expressions", "statements", "inline_cache",
+                     "type_inference", "type_feedback")
+
+
+def interpreter_version():
+    digest = hashlib.sha256(sys.version.encode())
+    src = os.path.dirname(os.path.abspath(__file__))
+    for module in FRONT_END_MODULES:
+        with open(os.path.join(src, module + ".py"), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class ProgramCache:
+    """
+    Keeps parsed and resolved programs on disk, one `.loxc` file per source
+    named after the source's hash. Each file starts with the interpreter
+    version that wrote it; a file from another version, or one that fails
+    to load, is a miss and gets rewritten.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self.version = interpreter_version().encode()
+
+    def path(self, source):
+        name = hashlib.sha256(source.encode()).hexdigest()
+        return os.path.join(self.directory, name + ".loxc")
+
+    def load(self, source):
+        """Returns the cached statements for `source`, or None on a miss."""
+        try:
+            with open(self.path(source), "rb") as f:
+                if f.readline().rstrip(b"\n") == self.version:
+                    statements = pickle.load(f)
+                    self.hits += 1
+                    return statements
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            pass
+
+        self.misses += 1
+        return None
+
+    def store(self, source, statements):
+        """
+        Writes `statements` for `source`. Must be called before they run,
+        while their inline caches are still empty. Failing to write only
+        means the next run misses again.
+        """
+        path = self.path(source)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temporary, "wb") as f:
+                f.write(self.version + b"\n")
+                pickle.dump(statements, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, path)
+        except (OSError, pickle.PicklingError, RecursionError):
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    def print_stats(self, file=sys.stderr):
+        print(f"compile cache: {self.hits} hits, {self.misses} misses ({self.directory})", file=file)
@@ -1,14 +1,86 @@
-from interpreter import Interpreter
-from tokens import Token
+from tokens import THIS, Token
 import statements as Stmt
 import expressions as Expr
 
+DECLARATIONS = (Stmt.Var, Stmt.Function, Stmt.Class)
 
-class Resolver:
 
-    def __init__(self, interpreter: Interpreter, report):
-        self.interpreter = interpreter
+def declares_any(statements):
+    return any(isinstance(statement, DECLARATIONS) for statement in statements)
+
+
+def declares_closure(statements):
+    """Whether a function or class is declared anywhere among `statements`, at any depth."""
+    for statement in statements:
+        if isinstance(statement, (Stmt.Function, Stmt.Class)):
+            return True
+        if isinstance(statement, Stmt.Block) and declares_closure(statement.statements):
+            return True
+        if isinstance(statement, Stmt.If):
+            branches = [statement.then_branch]
+            if statement.else_branch is not None:
+                branches.append(statement.else_branch)
+            if declares_closure(branches):
+                return True
+        if isinstance(statement, Stmt.While) and declares_closure([statement.body]):
+            return True
+    return False
+
+
+class Local:
+    """A variable of a local scope, and the references to it from its own function."""
+
+    __slots__ = ("slot", "on_capture", "captured", "references")
+
+    def __init__(self, slot, on_capture):
+        self.slot = slot
+        self.on_capture = on_capture
+        self.captured = False
+        self.references = []
+
+
+class FunctionScope:
+    """The function being resolved: where its scopes start and the variables it captures."""
+
+    __slots__ = ("first_scope", "upvalues", "cell_slots")
+
+    def __init__(self, first_scope):
+        self.first_scope = first_scope
+        self.upvalues = []
+        self.cell_slots = []
+
+
+class Resolver:
+    """
+    Resolves each local variable reference to a (depth, slot) pair: how many
+    environments out the variable lives and its index there.
+
+    Environments only reach as far as the function they belong to. A
+    function instead captures the variables of enclosing functions it
+    refers to as upvalues, resolved clox style through each function in
+    between, and references to them are resolved to the upvalue's index. A
+    captured variable is stored in a cell, so the function and the scope it
+    came from share it; the declaration and its function's own references
+    are marked once the scope ends and it is known to be captured.
+
+    Not every scope gets an environment of its own. Blocks that declare
+    nothing get none and aren't counted in depths. Blocks whose variables
+    can't be captured, because no function or class is declared inside
+    them, share the enclosing function's environment: their slots follow on
+    from its current ones and are reused once the block ends. Functions
+    without parameters or variables are called without an environment.
+    """
+
+    def __init__(self, report):
         self.scopes = []
+        self.locals = []
+        # Per scope: where its variables are stored, and how many slots of
+        # that environment are in use.
+        self.environments = []
+        self.sizes = []
+        # The top level is resolved like a function's body, for the blocks
+        # at the top level that functions can capture from.
+        self.functions = [FunctionScope(0)]
         self.report = report
         self.in_function = None
         self.in_class = None
@@ -17,13 +89,26 @@ class Resolver:
         for statement in statements:
             statement.accept(self)
 
-    def begin_scope(self):
+    def begin_scope(self, environment=Stmt.NEW_ENVIRONMENT):
         self.scopes.append({})
+        self.locals.append({})
+        self.environments.append(environment)
+        self.sizes.append(self.sizes[-1] if environment == Stmt.ENCLOSING_ENVIRONMENT else 0)
 
     def end_scope(self):
+        for local in self.locals[-1].values():
+            if local.captured:
+                if local.on_capture is not None:
+                    local.on_capture()
+                for expr in local.references:
+                    expr.mark_cell()
         self.scopes.pop(-1)
+        self.locals.pop(-1)
+        self.environments.pop(-1)
+        self.sizes.pop(-1)
 
-    def declare(self, name):
+    def declare(self, name, on_capture=None):
+        """Declares `name` in the innermost scope; `on_capture` is called if a closure captures it."""
         if len(self.scopes) == 0:
             return
 
@@ -32,6 +117,7 @@ class Resolver:
         if name.lexeme in scope:
             self.report(name, "Already a variable with this name in this scope.")
         scope[name.lexeme] = False
+        self.add_slot(name.lexeme, on_capture)
 
     def define(self, name):
         if len(self.scopes) == 0:
@@ -40,26 +126,95 @@ class Resolver:
         scope = self.scopes[-1]
         scope[name.lexeme] = True
 
+    def define_implicit(self, lexeme, on_capture=None):
+        self.scopes[-1][lexeme] = True
+        self.add_slot(lexeme, on_capture)
+
+    def add_slot(self, lexeme, on_capture):
+        # Slots follow declaration order, which is also the order the
+        # interpreter defines values in at runtime.
+        locals = self.locals[-1]
+        if lexeme not in locals:
+            locals[lexeme] = Local(self.sizes[-1], on_capture)
+            self.sizes[-1] += 1
+
+    def depth_between(self, inner, outer):
+        """How many environments there are from scope index `inner` out to scope index `outer`."""
+        return sum(1 for i in range(outer + 1, inner + 1) if self.environments[i] == Stmt.NEW_ENVIRONMENT)
+
     def resolve_local(self, expr: Expr, name: Token):
-        for (i, scope) in enumerate(reversed(self.scopes)):
-            if name.lexeme in scope:
-                self.interpreter.resolve(expr, i)
+        function = len(self.functions) - 1
+        for i in range(len(self.scopes) - 1, -1, -1):
+            if name.lexeme in self.scopes[i]:
+                local = self.locals[i][name.lexeme]
+                if i >= self.functions[function].first_scope:
+                    expr.resolve(self.depth_between(len(self.scopes) - 1, i), local.slot)
+                    local.references.append(expr)
+                else:
+                    expr.resolve_upvalue(self.add_upvalue(function, i, name.lexeme))
                 return
 
+    def add_upvalue(self, function, scope, lexeme):
+        """
+        Returns the index of the upvalue of `self.functions[function]` for
+        the variable `lexeme` of scope index `scope`, adding it to every
+        function in between as needed.
+        """
+        first_scope = self.functions[function].first_scope
+        if scope >= self.functions[function - 1].first_scope:
+            local = self.locals[scope][lexeme]
+            local.captured = True
+            # The function is created in the innermost scope enclosing it.
+            upvalue = (self.depth_between(first_scope - 1, scope), local.slot)
+        else:
+            upvalue = (None, self.add_upvalue(function - 1, scope, lexeme))
+
+        upvalues = self.functions[function].upvalues
+        if upvalue not in upvalues:
+            upvalues.append(upvalue)
+        return upvalues.index(upvalue)
+
+    def block_environment(self, statements):
+        if not declares_any(statements):
+            return Stmt.NO_ENVIRONMENT
+        if not self.environments or self.environments[-1] == Stmt.NO_ENVIRONMENT:
+            # At the top level, or directly inside a function called
+            # without an environment, there is none to share.
+            return Stmt.NEW_ENVIRONMENT
+        if declares_closure(statements):
+            return Stmt.NEW_ENVIRONMENT
+        return Stmt.ENCLOSING_ENVIRONMENT
+
     def resolve_function(self, stmt: Stmt.Function, function_type):
         enclosing = self.in_function
         self.in_function = function_type
-        self.begin_scope()
+        function = FunctionScope(len(self.scopes))
+        self.functions.append(function)
+        has_variables = function_type != 1 or stmt.params or declares_any(stmt.body)
+        self.begin_scope(Stmt.NEW_ENVIRONMENT if has_variables else Stmt.NO_ENVIRONMENT)
+        if function_type in (2, 3):
+            # Methods receive `this` in the first slot of their own scope.
+            self.define_implicit('this', lambda: function.cell_slots.append(0))
         for param in stmt.params:
-            self.declare(param)
+            slot = self.sizes[-1]
+            self.declare(param, lambda slot=slot: function.cell_slots.append(slot))
             self.define(param)
 
         self.resolve(*stmt.body)
         self.end_scope()
+        self.functions.pop(-1)
+        stmt.resolve_captures(function.upvalues, function.cell_slots)
+        if not has_variables and not function.upvalues:
+            stmt.mark_no_environment()
         self.in_function = enclosing
 
     def visit_block_stmt(self, stmt: Stmt.Block):
-        self.begin_scope()
+        environment = self.block_environment(stmt.statements)
+        stmt.mark_environment(environment)
+        if environment == Stmt.NO_ENVIRONMENT:
+            self.resolve(*stmt.statements)
+            return
+        self.begin_scope(environment)
         self.resolve(*stmt.statements)
         self.end_scope()
 
@@ -85,13 +240,15 @@ class Resolver:
             self.report(stmt.keyword, "Can't return from top-level code.")
         if stmt.value is not None:
             if self.in_function == 3:
-                self.resolve(stmt.keyword, "Can't return a value from an initializer.")
+                self.report(stmt.keyword, "Can't return a value from an initializer.")
+            elif isinstance(stmt.value, Expr.Call):
+                stmt.mark_tail_call()
             self.resolve(stmt.value)
 
     def visit_class_stmt(self, stmt: Stmt.Class):
         enclosing = self.in_class
         self.in_class = 1
-        self.declare(stmt.name)
+        self.declare(stmt.name, stmt.mark_captured)
         self.define(stmt.name)
 
         if stmt.superclass is not None:
@@ -101,11 +258,10 @@ class Resolver:
             self.resolve(stmt.superclass)
 
         if stmt.superclass is not None:
+            # Only methods refer to `super`, so it is always captured and
+            # always stored in a cell.
             self.begin_scope()
-            self.scopes[-1]['super'] = True
-
-        self.begin_scope()
-        self.scopes[-1]['this'] = True
+            self.define_implicit('super')
 
         for method in stmt.methods:
             declaration = 2
@@ -113,22 +269,20 @@ class Resolver:
                 declaration = 3
             self.resolve_function(method, declaration)
 
-        self.end_scope()
-
         if stmt.superclass is not None:
             self.end_scope()
 
         self.in_class = enclosing
 
     def visit_var_stmt(self, stmt: Stmt.Var):
-        self.declare(stmt.name)
+        self.declare(stmt.name, stmt.mark_captured)
         if stmt.initializer is not None:
             self.resolve(stmt.initializer)
 
         self.define(stmt.name)
 
     def visit_function_stmt(self, stmt: Stmt.Function):
-        self.declare(stmt.name)
+        self.declare(stmt.name, stmt.mark_captured)
         self.define(stmt.name)
 
         self.resolve_function(stmt, 1)
@@ -189,3 +343,6 @@ class Resolver:
             self.report(expr.keyword, "Can't use 'super' in a class with no superclass.")
 
         self.resolve_local(expr, expr.keyword)
+        this = Expr.This(Token(THIS, "this", None, expr.keyword.line))
+        self.resolve_local(this, this.keyword)
+        expr.resolve_this(this)
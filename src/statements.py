@@ -1,8 +1,16 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from expressions import Expr, Variable
 import tokens
 import typing
 
+# Where a block keeps its variables, as decided by the Resolver.
+NEW_ENVIRONMENT = "new"
+# The block declares nothing, so it runs in the current environment.
+NO_ENVIRONMENT = "none"
+# None of the block's variables can be captured, so they are appended to the
+# current environment and removed again when the block is left.
+ENCLOSING_ENVIRONMENT = "enclosing"
+
 
 class Stmt:
     def accept(self, visitor):
@@ -27,23 +35,35 @@ class Print(Stmt):
 
 @dataclass(frozen=True, eq=True)
 class Var(Stmt):
+    """`captured` is set by the Resolver when a closure refers to the variable."""
     name: tokens.Token
     initializer: Expr
+    captured: bool = field(default=False, compare=False, repr=False, kw_only=True)
 
     def accept(self, visitor):
         return visitor.visit_var_stmt(self)
 
+    def mark_captured(self):
+        object.__setattr__(self, "captured", True)
+
 
 @dataclass(frozen=True, eq=True)
 class Block(Stmt):
+    """`brace` is the `{`, or the `for` keyword for the blocks a for loop is desugared into."""
+    brace: tokens.Token
     statements: [Stmt]
+    environment: str = field(default=NEW_ENVIRONMENT, compare=False, repr=False, kw_only=True)
 
     def accept(self, visitor):
         return visitor.visit_block_stmt(self)
 
+    def mark_environment(self, environment):
+        object.__setattr__(self, "environment", environment)
+
 
 @dataclass(frozen=True, eq=True)
 class If(Stmt):
+    keyword: tokens.Token
     condition: Expr
     then_branch: Stmt
     else_branch: Stmt
@@ -54,6 +74,7 @@ class If(Stmt):
 
 @dataclass(frozen=True, eq=True)
 class While(Stmt):
+    keyword: tokens.Token
     condition: Expr
     body: Stmt
 
@@ -63,27 +84,67 @@ class While(Stmt):
 
 @dataclass(frozen=True, eq=True)
 class Function(Stmt):
+    """
+    Set by the Resolver:
+
+    `upvalues` says where each variable the function captures is found
+    when the function is created: a (depth, slot) pair for a variable of
+    the enclosing function, or (None, index) for one of its cells.
+    `cell_slots` are the slots of parameters (and `this`) that closures
+    capture, so each call has to box them in cells. `captured` is set when
+    a closure refers to the function's own name. `has_environment` is
+    cleared for functions with no parameters, variables or upvalues, whose
+    calls then run the body without an environment.
+    """
     name: tokens.Token
     params: [tokens.Token]
     body: [Stmt]
+    upvalues: tuple = field(default=(), compare=False, repr=False, kw_only=True)
+    cell_slots: tuple = field(default=(), compare=False, repr=False, kw_only=True)
+    captured: bool = field(default=False, compare=False, repr=False, kw_only=True)
+    has_environment: bool = field(default=True, compare=False, repr=False, kw_only=True)
 
     def accept(self, visitor):
         return visitor.visit_function_stmt(self)
 
+    def resolve_captures(self, upvalues, cell_slots):
+        object.__setattr__(self, "upvalues", tuple(upvalues))
+        object.__setattr__(self, "cell_slots", tuple(sorted(cell_slots)))
+
+    def mark_captured(self):
+        object.__setattr__(self, "captured", True)
+
+    def mark_no_environment(self):
+        object.__setattr__(self, "has_environment", False)
+
 
 @dataclass(frozen=True, eq=True)
 class Return(Stmt):
+    """
+    `tail_call` is set by the Resolver when the value is a call whose result
+    is returned as is, which lets the callee run in the caller's place.
+    """
     keyword: tokens.Token
     value: Expr
+    tail_call: bool = field(default=False, compare=False, repr=False, kw_only=True)
 
     def accept(self, visitor):
         return visitor.visit_return_stmt(self)
 
+    def mark_tail_call(self):
+        object.__setattr__(self, "tail_call", True)
+
+
 @dataclass(frozen=True, eq=True)
 class Class(Stmt):
+    """`captured` is set by the Resolver when a closure refers to the class."""
     name: tokens.Token
     superclass: Variable
     methods: [Function]
+    captured: bool = field(default=False, compare=False, repr=False, kw_only=True)
 
     def accept(self, visitor):
-        return visitor.visit_class_stmt(self)
\ No newline at end of file
+        return visitor.visit_class_stmt(self)
+
+    def mark_captured(self):
+        object.__setattr__(self, "captured", True)
\ No newline at end of file
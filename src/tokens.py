@@ -1,3 +1,5 @@
+from array import array
+
 
 class Token():
     def __init__(self, token_type, lexeme, literal, line):
@@ -57,3 +59,48 @@ VAR = 36
 WHILE = 37
 EOF = 38
 COLON = 39
+
+
+class TokenBuffer:
+    """
+    The scanned tokens of a source, stored as parallel array columns of
+    type, start offset, length and line. Lexemes and literals are sliced
+    from the source only when a `Token` is asked for by index, so tokens
+    the parser merely checks and skips are never built.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.types = array("B")
+        self.starts = array("I")
+        self.lengths = array("I")
+        self.lines = array("I")
+
+    def append(self, token_type, start, length, line):
+        self.types.append(token_type)
+        self.starts.append(start)
+        self.lengths.append(length)
+        self.lines.append(line)
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        token_type = self.types[index]
+        start = self.starts[index]
+        lexeme = self.source[start:start + self.lengths[index]]
+        return Token(token_type, lexeme, literal(token_type, lexeme), self.lines[index])
+
+    def __iter__(self):
+        for index in range(len(self.types)):
+            yield self[index]
+
+
+def literal(token_type, lexeme):
+    if token_type == NUMBER:
+        return float(lexeme)
+    if token_type == STRING:
+        return lexeme[1:-1]
+    if token_type == EOF:
+        return ""
+    return None
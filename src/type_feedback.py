@@ -0,0 +1,71 @@
+import sys
+
+from inline_cache import cached_sites
+
+# Executions in a row with the same operand types, or the same callee, after
+# which a node is rewritten into its specialized variant.
+SPECIALIZE_AFTER = 8
+# Guard failures after which a node stays generic for good.
+DESPECIALIZE_LIMIT = 3
+
+
+class TypeFeedback:
+    """
+    What the tree-walker has seen at one Binary or Call node: the kind of
+    operands or callee of the current run of executions and how long that
+    run is, plus how often the node has been specialized and fallen back.
+
+    For calls `target` is the callee the run saw (a function's declaration,
+    or the native itself); once specialized, for binaries it is the
+    operator to apply without checks.
+    """
+
+    __slots__ = ("kind", "target", "count", "specialized", "specializations", "despecializations")
+
+    def __init__(self):
+        self.kind = None
+        self.target = None
+        self.count = 0
+        self.specialized = None
+        self.specializations = 0
+        self.despecializations = 0
+
+    def observe(self, kind, target=None):
+        """Records one execution and returns True when the node has become hot."""
+        if self.specialized is not None:
+            # A recursive execution of the node specialized it while this
+            # one was evaluating its operands.
+            return False
+        if kind is not None and kind == self.kind and target is self.target:
+            self.count += 1
+        else:
+            self.kind = kind
+            self.target = target
+            self.count = 1
+        return kind is not None and self.count >= SPECIALIZE_AFTER
+
+    def is_generic(self):
+        return self.despecializations >= DESPECIALIZE_LIMIT
+
+    def state(self):
+        if self.specialized is not None:
+            return self.specialized
+        if self.is_generic():
+            return "generic"
+        if self.count == 0:
+            return "uninitialized"
+        return "unspecialized"
+
+
+def print_specialization_stats(statements, file=sys.stderr):
+    for node, feedback in cached_sites(statements, TypeFeedback):
+        if feedback.count == 0 and feedback.specializations == 0:
+            continue
+        if hasattr(node, "operator"):
+            site = f"{node.operator.lexeme}"
+            line = node.operator.line
+        else:
+            site = "call"
+            line = node.paren.line
+        print(f"[line {line}] {site}: {feedback.state()} "
+              f"({feedback.specializations} specialized, {feedback.despecializations} despecialized)", file=file)
@@ -0,0 +1,264 @@
+import expressions as Expr
+import statements as Stmt
+import tokens
+
+NUMBER = "number"
+STRING = "string"
+# No value seen yet. Bindings start here and are narrowed to a type or to
+# UNKNOWN as the values assigned to them are typed.
+UNSEEN = "unseen"
+UNKNOWN = None
+
+# Operators that raise unless both operands are numbers.
+NUMERIC_OPERATORS = {
+    tokens.MINUS,
+    tokens.STAR,
+    tokens.SLASH,
+    tokens.GREATER,
+    tokens.GREATER_EQUAL,
+    tokens.LESS,
+    tokens.LESS_EQUAL,
+}
+
+
+def join(a, b):
+    if a == UNSEEN:
+        return b
+    if b == UNSEEN or a == b:
+        return a
+    return UNKNOWN
+
+
+class Binding:
+    """A local variable, and every expression whose value is stored in it."""
+
+    __slots__ = ("type", "values")
+
+    def __init__(self, values=None):
+        self.type = UNSEEN if values is not None else UNKNOWN
+        self.values = values
+
+
+class TypeInference:
+    """
+    Proves which operands of arithmetic and comparisons are always numbers,
+    or always strings, and records that on the Binary and Unary nodes so
+    the engines can skip their runtime type checks there.
+
+    Only locals are tracked. Each gets a Binding holding the expressions
+    assigned to it, starting with its initializer; parameters, `this`,
+    functions and classes are UNKNOWN. Binding types are then narrowed to a
+    fixed point, which is sound because a local can't be read before its
+    declaration has stored a value. Globals are UNKNOWN since they may be
+    read before this program sets them, e.g. at the prompt.
+    """
+
+    def __init__(self):
+        self.scopes = []
+        self.bindings = []
+        self.references = {}
+        self.operations = []
+
+    def infer(self, *statements):
+        self.walk(*statements)
+
+        changed = True
+        while changed:
+            changed = False
+            for binding in self.bindings:
+                binding_type = UNSEEN
+                for value in binding.values:
+                    binding_type = join(binding_type, self.type_of(value))
+                if binding_type != binding.type:
+                    binding.type = binding_type
+                    changed = True
+
+        for expr in self.operations:
+            self.annotate(expr)
+
+    def walk(self, *nodes):
+        for node in nodes:
+            node.accept(self)
+
+    def declare(self, name: tokens.Token, value=None):
+        if len(self.scopes) == 0:
+            return
+        binding = Binding(None if value is None else [value])
+        if value is not None:
+            self.bindings.append(binding)
+        self.scopes[-1].append(binding)
+
+    def reference(self, expr: Expr.Resolvable, name: tokens.Token):
+        if expr.depth is not None:
+            binding = self.scopes[-1 - expr.depth][expr.slot]
+            self.references[id(expr)] = binding
+            return binding
+        return None
+
+    def type_of(self, expr: Expr.Expr):
+        """The type `expr` always evaluates to, given the current binding types."""
+        expr_type = type(expr)
+        if expr_type is Expr.Literal:
+            if type(expr.value) is float:
+                return NUMBER
+            if type(expr.value) is str:
+                return STRING
+            return UNKNOWN
+        if expr_type is Expr.Variable:
+            binding = self.references.get(id(expr))
+            return UNKNOWN if binding is None else binding.type
+        if expr_type is Expr.Assign:
+            return self.type_of(expr.value)
+        if expr_type is Expr.Grouping:
+            return self.type_of(expr.expression)
+        if expr_type is Expr.Unary:
+            return NUMBER if expr.operator.token_type == tokens.MINUS else UNKNOWN
+        if expr_type is Expr.Logical:
+            return join(self.type_of(expr.left), self.type_of(expr.right))
+        if expr_type is Expr.Binary:
+            token_type = expr.operator.token_type
+            if token_type in (tokens.MINUS, tokens.STAR, tokens.SLASH):
+                return NUMBER
+            if token_type == tokens.PLUS:
+                # `+` only succeeds on two numbers or two strings, so either
+                # operand's type is also the result's.
+                left = self.type_of(expr.left)
+                right = self.type_of(expr.right)
+                if left == NUMBER or left == STRING:
+                    return left
+                if right == NUMBER or right == STRING:
+                    return right
+                if left == UNSEEN or right == UNSEEN:
+                    return UNSEEN
+        return UNKNOWN
+
+    def annotate(self, expr):
+        if type(expr) is Expr.Unary:
+            if expr.operator.token_type == tokens.MINUS and self.type_of(expr.right) == NUMBER:
+                expr.annotate(NUMBER)
+            return
+
+        left = self.type_of(expr.left)
+        if left != self.type_of(expr.right):
+            return
+        token_type = expr.operator.token_type
+        if left == NUMBER and (token_type in NUMERIC_OPERATORS or token_type == tokens.PLUS):
+            expr.annotate(NUMBER)
+        elif left == STRING and token_type == tokens.PLUS:
+            expr.annotate(STRING)
+
+    def begin_scope(self):
+        # Scopes mirror the runtime environments, as lists of bindings
+        # indexed by slot, since that is what depths and slots refer to.
+        self.scopes.append([])
+
+    def end_scope(self):
+        self.scopes.pop(-1)
+
+    def walk_function(self, stmt: Stmt.Function, is_method):
+        if not stmt.has_environment:
+            self.walk(*stmt.body)
+            return
+        self.begin_scope()
+        if is_method:
+            self.declare(tokens.Token(tokens.THIS, "this", None, stmt.name.line))
+        for param in stmt.params:
+            self.declare(param)
+        self.walk(*stmt.body)
+        self.end_scope()
+
+    def visit_block_stmt(self, stmt: Stmt.Block):
+        if stmt.environment == Stmt.NEW_ENVIRONMENT:
+            self.begin_scope()
+            self.walk(*stmt.statements)
+            self.end_scope()
+            return
+
+        scope = self.scopes[-1] if self.scopes else []
+        size = len(scope)
+        self.walk(*stmt.statements)
+        del scope[size:]
+
+    def visit_class_stmt(self, stmt: Stmt.Class):
+        self.declare(stmt.name)
+        if stmt.superclass is not None:
+            self.walk(stmt.superclass)
+            self.begin_scope()
+            self.declare(tokens.Token(tokens.SUPER, "super", None, stmt.name.line))
+        for method in stmt.methods:
+            self.walk_function(method, is_method=True)
+        if stmt.superclass is not None:
+            self.end_scope()
+
+    def visit_expression_stmt(self, stmt: Stmt.Expression):
+        self.walk(stmt.expression)
+
+    def visit_function_stmt(self, stmt: Stmt.Function):
+        self.declare(stmt.name)
+        self.walk_function(stmt, is_method=False)
+
+    def visit_if_stmt(self, stmt: Stmt.If):
+        self.walk(stmt.condition, stmt.then_branch)
+        if stmt.else_branch is not None:
+            self.walk(stmt.else_branch)
+
+    def visit_print_stmt(self, stmt: Stmt.Print):
+        self.walk(stmt.expression)
+
+    def visit_return_stmt(self, stmt: Stmt.Return):
+        if stmt.value is not None:
+            self.walk(stmt.value)
+
+    def visit_var_stmt(self, stmt: Stmt.Var):
+        initializer = stmt.initializer
+        if initializer is None:
+            initializer = Expr.Literal(None)
+        else:
+            self.walk(initializer)
+        # A captured variable can be assigned by closures, whose assignments
+        # refer to it as an upvalue, so its type is left unknown.
+        self.declare(stmt.name, None if stmt.captured else initializer)
+
+    def visit_while_stmt(self, stmt: Stmt.While):
+        self.walk(stmt.condition, stmt.body)
+
+    def visit_assign_expr(self, expr: Expr.Assign):
+        self.walk(expr.value)
+        binding = self.reference(expr, expr.name)
+        if binding is not None and binding.values is not None:
+            binding.values.append(expr.value)
+
+    def visit_binary_expr(self, expr: Expr.Binary):
+        self.walk(expr.left, expr.right)
+        self.operations.append(expr)
+
+    def visit_call_expr(self, expr: Expr.Call):
+        self.walk(expr.callee, *expr.arguments)
+
+    def visit_get_expr(self, expr: Expr.Get):
+        self.walk(expr.object)
+
+    def visit_grouping_expr(self, expr: Expr.Grouping):
+        self.walk(expr.expression)
+
+    def visit_literal_expr(self, expr: Expr.Literal):
+        return
+
+    def visit_logical_expr(self, expr: Expr.Logical):
+        self.walk(expr.left, expr.right)
+
+    def visit_set_expr(self, expr: Expr.Set):
+        self.walk(expr.value, expr.object)
+
+    def visit_super_expr(self, expr: Expr.Super):
+        return
+
+    def visit_this_expr(self, expr: Expr.This):
+        return
+
+    def visit_unary_expr(self, expr: Expr.Unary):
+        self.walk(expr.right)
+        self.operations.append(expr)
+
+    def visit_variable_expr(self, expr: Expr.Variable):
+        self.reference(expr, expr.name)
@@ -0,0 +1,537 @@
+from chunk import (
+    ADD,
+    CALL,
+    CHECK_INSTANCE,
+    CLASS,
+    CLOSE_UPVALUE,
+    CLOSURE,
+    CONSTANT,
+    DEFINE_GLOBAL,
+    DIVIDE,
+    EQUAL,
+    FALSE,
+    GET_GLOBAL,
+    GET_LOCAL,
+    GET_PROPERTY,
+    GET_SUPER,
+    GET_UPVALUE,
+    GREATER,
+    GREATER_EQUAL,
+    INHERIT,
+    INVOKE,
+    JUMP,
+    JUMP_IF_FALSE,
+    JUMP_IF_TRUE,
+    LESS,
+    LESS_EQUAL,
+    METHOD,
+    MULTIPLY,
+    NEGATE,
+    NIL,
+    NOT,
+    NOT_EQUAL,
+    POP,
+    POP_JUMP_IF_FALSE,
+    PRINT,
+    RETURN,
+    SET_GLOBAL,
+    SET_LOCAL,
+    SET_PROPERTY,
+    SET_UPVALUE,
+    STEP,
+    SUBTRACT,
+    SUPER_INVOKE,
+    TRUE,
+)
+import types
+
+from compiler import Compiler
+from environment import GlobalEnvironment
+from errors import LoxRuntimeError
+import interpreter
+
+FRAMES_MAX = 10000
+
+
+class Upvalue:
+    """
+    A captured variable. While open it points into the VM stack; closing it
+    moves the value into a private one element list, so reads and writes are
+    always `cells[index]`.
+    """
+
+    __slots__ = ("cells", "index")
+
+    def __init__(self, cells, index):
+        self.cells = cells
+        self.index = index
+
+    def close(self):
+        self.cells = [self.cells[self.index]]
+        self.index = 0
+
+
+class VMClosure:
+    __slots__ = ("proto", "upvalues")
+
+    def __init__(self, proto, upvalues):
+        self.proto = proto
+        self.upvalues = upvalues
+
+    def arity(self):
+        return self.proto.arity
+
+    def to_string(self):
+        return self.proto.to_string()
+
+
+class VMClass:
+    def __init__(self, name):
+        self.name = name
+        self.methods = {}
+
+    def to_string(self):
+        return self.name
+
+
+class VMInstance:
+    __slots__ = ("klass", "fields")
+
+    def __init__(self, klass: VMClass):
+        self.klass = klass
+        self.fields = {}
+
+    def to_string(self):
+        return f"{self.klass.name} instance"
+
+
+class VMBoundMethod:
+    __slots__ = ("receiver", "method")
+
+    def __init__(self, receiver, method: VMClosure):
+        self.receiver = receiver
+        self.method = method
+
+    def to_string(self):
+        return self.method.to_string()
+
+
+class VM:
+    """
+    Stack based bytecode virtual machine. Programs are compiled by `Compiler`
+    and executed in a single dispatch loop; Lox calls push call frames rather
+    than recursing in Python.
+    """
+
+    # Where `print` writes to; None for stdout.
+    output = None
+
+    def __init__(self, report, meter=None):
+        self.report = report
+        # With a meter, the compiler emits a STEP before each statement.
+        self.meter = meter
+        self.global_env = GlobalEnvironment()
+        self.globals = self.global_env.values
+        self.globals["clock"] = interpreter.CLOCK
+        self.globals["print"] = interpreter.PRINT
+
+    def interpret(self, stmts):
+        self.prepare(stmts)()
+
+    def prepare(self, stmts):
+        """
+        Compiles `stmts` to bytecode and returns a function that runs it
+        against `globals` each time it is called, reporting any runtime
+        error.
+        """
+        proto = Compiler(self.meter is not None).compile(stmts)
+
+        def run():
+            try:
+                self.run(VMClosure(proto, []))
+            except LoxRuntimeError as ir:
+                self.report(ir)
+        return run
+
+    def run(self, script: VMClosure):
+        """Runs `script` to completion and returns its result."""
+        steps = self.execute(script)
+        try:
+            next(steps)
+        except StopIteration as done:
+            return done.value
+        steps.close()
+        raise RuntimeError("A native returned a coroutine outside AsyncVM.")
+
+    def execute(self, script: VMClosure):
+        """
+        The dispatch loop, as a generator. A native that returns a coroutine
+        suspends the loop: the coroutine and the call's token are yielded,
+        and the value sent back in becomes the call's result. Otherwise it
+        runs straight through and returns the script's result.
+        """
+        stack = [script]
+        frames = []
+        open_upvalues = {}
+        globals_ = self.globals
+        meter = self.meter
+
+        closure = script
+        chunk = closure.proto.chunk
+        code = chunk.code
+        constants = chunk.constants
+        ip = 0
+        base = 0
+
+        def capture_upvalue(slot):
+            upvalue = open_upvalues.get(slot)
+            if upvalue is None:
+                upvalue = Upvalue(stack, slot)
+                open_upvalues[slot] = upvalue
+            return upvalue
+
+        def close_upvalues(from_slot):
+            for slot in [s for s in open_upvalues if s >= from_slot]:
+                open_upvalues.pop(slot).close()
+
+        while True:
+            instruction = code[ip]
+            arg = code[ip + 1]
+            ip += 2
+
+            if instruction == GET_LOCAL:
+                stack.append(stack[base + arg])
+
+            elif instruction == CONSTANT:
+                stack.append(constants[arg])
+
+            elif instruction == SET_LOCAL:
+                stack[base + arg] = stack[-1]
+
+            elif instruction == POP:
+                stack.pop()
+
+            elif instruction == GET_GLOBAL:
+                try:
+                    stack.append(globals_[constants[arg]])
+                except KeyError:
+                    name = constants[arg]
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], f"Undefined Variable '{name}'.")
+
+            elif instruction == GET_UPVALUE:
+                upvalue = closure.upvalues[arg]
+                stack.append(upvalue.cells[upvalue.index])
+
+            elif instruction == POP_JUMP_IF_FALSE:
+                value = stack.pop()
+                if value is None or value is False:
+                    ip = arg
+
+            elif instruction == JUMP:
+                ip = arg
+
+            elif instruction == ADD:
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is float and type(right) is float \
+                        or type(left) is str and type(right) is str:
+                    stack[-1] = left + right
+                else:
+                    raise LoxRuntimeError(
+                        chunk.tokens[ip - 2],
+                        "Operands must both be either strings or numbers")
+
+            elif instruction == SUBTRACT:
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Operand must be a number.")
+                stack[-1] = left - right
+
+            elif instruction == LESS:
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Operand must be a number.")
+                stack[-1] = left < right
+
+            elif instruction == CALL:
+                callee = stack[-1 - arg]
+                if type(callee) is not VMClosure:
+                    callee = self.prepare_call(stack, callee, arg, chunk.tokens[ip - 2])
+                    if callee is None:
+                        if type(stack[-1]) is types.CoroutineType:
+                            stack[-1] = yield stack[-1], chunk.tokens[ip - 2]
+                        continue
+                if arg != callee.proto.arity:
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Wrong number of arguments.")
+                if len(frames) == FRAMES_MAX:
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Stack overflow.")
+                frames.append((closure, ip, base))
+                closure = callee
+                chunk = closure.proto.chunk
+                code = chunk.code
+                constants = chunk.constants
+                ip = 0
+                base = len(stack) - 1 - arg
+
+            elif instruction == RETURN:
+                result = stack[-1]
+                if open_upvalues:
+                    close_upvalues(base)
+                del stack[base:]
+                if not frames:
+                    return result
+                stack.append(result)
+                closure, ip, base = frames.pop()
+                chunk = closure.proto.chunk
+                code = chunk.code
+                constants = chunk.constants
+
+            elif instruction == STEP:
+                meter.steps += 1
+                if meter.steps >= meter.limit:
+                    meter.check(chunk.tokens[ip - 2])
+
+            elif instruction == SET_GLOBAL:
+                name = constants[arg]
+                if name not in globals_:
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], f"Undefined Variable '{name}'.")
+                globals_[name] = stack[-1]
+
+            elif instruction == SET_UPVALUE:
+                upvalue = closure.upvalues[arg]
+                upvalue.cells[upvalue.index] = stack[-1]
+
+            elif instruction == MULTIPLY:
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Operand must be a number.")
+                stack[-1] = left * right
+
+            elif instruction == DIVIDE:
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Operand must be a number.")
+                stack[-1] = left / right
+
+            elif instruction == GREATER:
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Operand must be a number.")
+                stack[-1] = left > right
+
+            elif instruction == GREATER_EQUAL:
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Operand must be a number.")
+                stack[-1] = left >= right
+
+            elif instruction == LESS_EQUAL:
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Operand must be a number.")
+                stack[-1] = left <= right
+
+            elif instruction == EQUAL:
+                right = stack.pop()
+                stack[-1] = stack[-1] == right
+
+            elif instruction == NOT_EQUAL:
+                right = stack.pop()
+                stack[-1] = not stack[-1] == right
+
+            elif instruction == INVOKE:
+                name, argc = constants[arg]
+                receiver = stack[-1 - argc]
+                if not isinstance(receiver, VMInstance):
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Only instances have properties")
+
+                if name in receiver.fields:
+                    # Fields shadow methods; call whatever value is stored there.
+                    callee = receiver.fields[name]
+                    stack[-1 - argc] = callee
+                    if type(callee) is not VMClosure:
+                        callee = self.prepare_call(stack, callee, argc, chunk.tokens[ip - 2])
+                        if callee is None:
+                            if type(stack[-1]) is types.CoroutineType:
+                                stack[-1] = yield stack[-1], chunk.tokens[ip - 2]
+                            continue
+                else:
+                    callee = receiver.klass.methods.get(name)
+                    if callee is None:
+                        raise LoxRuntimeError(chunk.tokens[ip - 2], f"Undefined property {name}.")
+
+                if argc != callee.proto.arity:
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Wrong number of arguments.")
+                if len(frames) == FRAMES_MAX:
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Stack overflow.")
+                frames.append((closure, ip, base))
+                closure = callee
+                chunk = closure.proto.chunk
+                code = chunk.code
+                constants = chunk.constants
+                ip = 0
+                base = len(stack) - 1 - argc
+
+            elif instruction == GET_PROPERTY:
+                instance = stack[-1]
+                if not isinstance(instance, VMInstance):
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Only instances have properties")
+                name = constants[arg]
+                fields = instance.fields
+                if name in fields:
+                    stack[-1] = fields[name]
+                else:
+                    method = instance.klass.methods.get(name)
+                    if method is None:
+                        raise LoxRuntimeError(chunk.tokens[ip - 2], f"Undefined property {name}.")
+                    stack[-1] = VMBoundMethod(instance, method)
+
+            elif instruction == SET_PROPERTY:
+                value = stack.pop()
+                instance = stack[-1]
+                if not isinstance(instance, VMInstance):
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Only instances have properties")
+                instance.fields[constants[arg]] = value
+                stack[-1] = None
+
+            elif instruction == CHECK_INSTANCE:
+                if not isinstance(stack[-1], VMInstance):
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Only instances have properties")
+
+            elif instruction == NIL:
+                stack.append(None)
+
+            elif instruction == TRUE:
+                stack.append(True)
+
+            elif instruction == FALSE:
+                stack.append(False)
+
+            elif instruction == JUMP_IF_FALSE:
+                value = stack[-1]
+                if value is None or value is False:
+                    ip = arg
+
+            elif instruction == JUMP_IF_TRUE:
+                value = stack[-1]
+                if value is not None and value is not False:
+                    ip = arg
+
+            elif instruction == NOT:
+                value = stack[-1]
+                stack[-1] = value is None or value is False
+
+            elif instruction == NEGATE:
+                value = stack[-1]
+                if type(value) is not float:
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Operand must be a number.")
+                stack[-1] = -value
+
+            elif instruction == DEFINE_GLOBAL:
+                globals_[constants[arg]] = stack.pop()
+
+            elif instruction == CLOSURE:
+                proto = constants[arg]
+                upvalues = []
+                for is_local, index in proto.upvalues:
+                    if is_local:
+                        upvalues.append(capture_upvalue(base + index))
+                    else:
+                        upvalues.append(closure.upvalues[index])
+                stack.append(VMClosure(proto, upvalues))
+
+            elif instruction == CLOSE_UPVALUE:
+                close_upvalues(len(stack) - 1)
+                stack.pop()
+
+            elif instruction == GET_SUPER:
+                superclass = stack.pop()
+                receiver = stack[-1]
+                name = constants[arg]
+                method = superclass.methods.get(name)
+                if method is None:
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], f"Undefined property {name}.")
+                stack[-1] = VMBoundMethod(receiver, method)
+
+            elif instruction == SUPER_INVOKE:
+                name, argc = constants[arg]
+                superclass = stack.pop()
+                callee = superclass.methods.get(name)
+                if callee is None:
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], f"Undefined property {name}.")
+                if argc != callee.proto.arity:
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Wrong number of arguments.")
+                if len(frames) == FRAMES_MAX:
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Stack overflow.")
+                frames.append((closure, ip, base))
+                closure = callee
+                chunk = closure.proto.chunk
+                code = chunk.code
+                constants = chunk.constants
+                ip = 0
+                base = len(stack) - 1 - argc
+
+            elif instruction == CLASS:
+                stack.append(VMClass(constants[arg]))
+
+            elif instruction == INHERIT:
+                superclass = stack[-2]
+                if not isinstance(superclass, VMClass):
+                    raise LoxRuntimeError(chunk.tokens[ip - 2], "Superclass must be a class.")
+                subclass = stack.pop()
+                subclass.methods.update(superclass.methods)
+
+            elif instruction == METHOD:
+                method = stack.pop()
+                stack[-1].methods[constants[arg]] = method
+
+            elif instruction == PRINT:
+                value = stack.pop()
+                if hasattr(value, "to_string") and callable(value.to_string):
+                    value = value.to_string()
+                print(value, file=self.output)
+
+            else:
+                raise RuntimeError(f"Unknown opcode {instruction}.")
+
+    def prepare_call(self, stack, callee, argc, token):
+        """
+        Sets up a call to anything other than a plain closure. Returns the
+        closure whose frame should be pushed, or None when the call has
+        already completed and left its result on the stack.
+        """
+        if type(callee) is VMBoundMethod:
+            stack[-1 - argc] = callee.receiver
+            return callee.method
+
+        if type(callee) is VMClass:
+            stack[-1 - argc] = VMInstance(callee)
+            initializer = callee.methods.get("init")
+            if initializer is None:
+                if argc != 0:
+                    raise LoxRuntimeError(token, "Wrong number of arguments.")
+                return None
+            return initializer
+
+        if not hasattr(callee, "call") or not callable(callee.call):
+            raise LoxRuntimeError(token, "Can only call functions and classes.")
+        if argc != callee.arity():
+            raise LoxRuntimeError(token, "Wrong number of arguments.")
+        start = len(stack) - argc
+        try:
+            result = callee.call(self, stack[start:])
+        except LoxRuntimeError as error:
+            # Natives don't know where they were called from.
+            if error.token is None:
+                error.token = token
+            raise
+        del stack[start - 1:]
+        stack.append(result)
+        return None
@@ -0,0 +1,65 @@
+"""
+Runs every script in this directory on each engine and checks what it
+prints against the `// expect: ...` comments in it, in order. A script
+that should stop with a runtime error says so, on the line that raises
+it, with `// expect runtime error: ...`. Options a script needs, such as
+a step budget, go on a `// args: ...` line.
+
+    python tests/run.py [--engine ENGINE]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LOX = os.path.join(HERE, "..", "src", "lox.py")
+ENGINES = ("tree", "jit", "closure", "vm", "async")
+EXPECT = re.compile(r"// expect: (.*)$")
+EXPECT_RUNTIME_ERROR = re.compile(r"// expect runtime error: (.*)$")
+ARGS = re.compile(r"// args: (.*)$")
+
+
+def expected_output(path):
+    """The lines `path` should print, and the status it should exit with."""
+    output = []
+    status = 0
+    with open(path, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            match = EXPECT.search(line)
+            if match:
+                output.append(match.group(1))
+            match = EXPECT_RUNTIME_ERROR.search(line)
+            if match:
+                output += [match.group(1), f"[line {line_number}]"]
+                status = 70
+    return output, status
+
+
+def script_args(path):
+    with open(path, "r") as f:
+        return [arg for match in map(ARGS.search, f) if match for arg in match.group(1).split()]
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--engine", action="append", choices=ENGINES)
+    options = arg_parser.parse_args(args)
+
+    failed = 0
+    scripts = sorted(name for name in os.listdir(HERE) if name.endswith(".lox"))
+    for engine in options.engine or ENGINES:
+        for name in scripts:
+            path = os.path.join(HERE, name)
+            run = subprocess.run([sys.executable, LOX, "--engine", engine, *script_args(path), path], capture_output=True, text=True)
+            if (run.stdout.splitlines(), run.returncode) != expected_output(path):
+                failed += 1
+                print(f"FAIL {engine} {name} (exit {run.returncode})")
+                print(run.stdout + run.stderr)
+    print(f"{len(scripts) * len(options.engine or ENGINES) - failed} passed, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))